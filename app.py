@@ -1,19 +1,58 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, current_app, jsonify
+from flask import Request as FlaskRequest
 from werkzeug.utils import secure_filename
 import os
+import tempfile
+import shutil
+import sys
+import time
+import asyncio
+import math
+import sqlite3
+from contextlib import closing
+from abc import ABC, abstractmethod
+import multiprocessing
+import threading
+import queue
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import Future, CancelledError
+from collections import OrderedDict, deque
 import pdfplumber
+import pypdfium2 as pdfium
 import ollama
+import httpx
 import json
 import re
+import hashlib
+import uuid
+import io
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from dateutil import parser as date_parser
 
+# resource is only used as a fallback for reading memory usage outside Linux, and doesn't exist on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+"""
+# Name: UploadRequest - Upload-Aware Request Class
+# Desc: Keeps uploaded files in memory while they are parsed from the request, only spilling to a temp file above UPLOAD_SPOOL_MAX_MEMORY
+# Precondition: Installed as app.request_class
+# Postcondition: Every FileStorage.stream is a seekable SpooledTemporaryFile that the extractors can read directly
+"""
+class UploadRequest(FlaskRequest):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=current_app.config['UPLOAD_SPOOL_MAX_MEMORY'], mode='rb+')
+
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 
 # Sets up constants - where files are saved and Allowed File Types
 UPLOAD_FOLDER = 'uploads'
@@ -23,12 +62,235 @@ ALLOWED_EXTENSIONS = {'pdf'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.secret_key = 'supersecretkey'
 
-# Ensures uploads folder exists
+# Upload handling - uploads up to this size stay in memory (larger ones spill to a temp file),
+# and uploads are only written to UPLOAD_FOLDER when persisting is turned on
+app.config['UPLOAD_SPOOL_MAX_MEMORY'] = 16 * 1024 * 1024
+app.config['PERSIST_UPLOADS'] = False
+
+# PDF extraction settings - worker processes used for parallel extraction, the page count below which
+# extraction stays serial (pool overhead isn't worth it), and how many pages each worker task handles
+app.config['EXTRACT_WORKERS'] = os.cpu_count() or 1
+app.config['EXTRACT_PARALLEL_MIN_PAGES'] = 24
+app.config['EXTRACT_PAGES_PER_TASK'] = 8
+# Per-document extraction ceilings - the most pages a PDF may have, and how much memory extracting it may add across all of the
+# worker processes reading its pages (0 turns a check off). Memory can only be measured per document inside the extraction
+# workers, so with a memory ceiling set every document is extracted there (small ones as a single task) - setting it to 0 lets
+# small documents be extracted in the server process instead
+app.config['EXTRACT_MAX_PAGES'] = 300
+app.config['EXTRACT_MAX_MEMORY_MB'] = 1024
+# Default extraction engine when the upload form doesn't pick one - 'accurate' (pdfplumber) or 'fast' (pypdfium2)
+app.config['EXTRACTION_ENGINE'] = 'accurate'
+
+# Version of the page record format - bumped whenever the engines start storing something new, so stale cache entries are ignored
+PAGE_RECORD_VERSION = 2
+
+# Extracted text cache settings - where page text is stored by file hash, and the total size the cache may grow to
+PDF_CACHE_FOLDER = os.path.join('cache', 'pdf_text')
+app.config['PDF_CACHE_FOLDER'] = PDF_CACHE_FOLDER
+app.config['PDF_CACHE_MAX_BYTES'] = 256 * 1024 * 1024
+
+# Turns schedule tables (Week/Date/Topic/Due) directly into events, only the text outside them goes to the LLM
+app.config['TABLE_EVENTS_ENABLED'] = True
+
+# Date prefilter settings - pages need at least this many date mentions per 1000 characters to be sent to the LLM
+app.config['DATE_FILTER_ENABLED'] = True
+app.config['DATE_FILTER_MIN_DENSITY'] = 1.0
+
+# Rule-based extractor - skips the LLM entirely when its regexes explain at least this share of the calendar dates in the text.
+# Matches below the minimum confidence are dropped and their lines are left for the LLM to read
+app.config['RULES_ENABLED'] = True
+app.config['RULES_MIN_COVERAGE'] = 0.9
+app.config['RULES_MIN_CONFIDENCE'] = 0.75
+
+# LLM backend - 'ollama', 'openai' (any OpenAI-compatible local server, e.g., llama.cpp or vLLM) or 'stub' (canned replies,
+# no model needed), the server's base URL (empty for the backend's default), and an API key if the server needs one
+app.config['LLM_BACKEND'] = 'ollama'
+app.config['LLM_BASE_URL'] = ''
+app.config['LLM_API_KEY'] = ''
+# Stub backend - a JSON file holding a list of canned replies (empty for one built-in reply), the delay before the first
+# token, and how fast the reply streams (0 streams it all at once)
+app.config['LLM_STUB_RESPONSES'] = ''
+app.config['LLM_STUB_LATENCY'] = 0.5
+app.config['LLM_STUB_CHARS_PER_SECOND'] = 400
+
+# LLM settings - the model, its context window (num_ctx), the tokens kept free in it for the reply,
+# and how many tokens of each chunk's end are repeated at the start of the next so events on a boundary aren't split
+app.config['LLM_MODEL'] = 'llama3.2'
+app.config['LLM_NUM_CTX'] = 4096
+app.config['LLM_OUTPUT_TOKENS'] = 1024
+app.config['LLM_CHUNK_OVERLAP_TOKENS'] = 100
+# Characters per token the token estimator (and so the chunker) assumes. It only changes when recalibrated - measure it for
+# the model with "python benchmark.py <pdfs> --calibrate" and set it here - so the same syllabus always splits into the same
+# chunks and hits the response cache
+app.config['LLM_CHARS_PER_TOKEN'] = 4.0
+# Model cascade - a larger model that re-runs only the chunks whose LLM_MODEL output scores below the threshold
+# (0-1, see score_chunk_events). Empty turns the cascade off
+app.config['LLM_ESCALATION_MODEL'] = ''
+app.config['LLM_ESCALATION_MIN_SCORE'] = 0.7
+# How many chunk requests run at once across all uploads (match the Ollama server's OLLAMA_NUM_PARALLEL), how many server
+# processes share them (e.g., gunicorn -w), and how long a whole syllabus may take before unfinished chunks are cancelled.
+# Each process runs its own scheduler with an equal share of the slots, so priorities and per-user fairness only hold between
+# the uploads one process is handling - run one process (with threads) if they must hold across every upload
+app.config['LLM_MAX_IN_FLIGHT'] = 2
+app.config['LLM_SERVER_PROCESSES'] = 1
+app.config['LLM_TIMEOUT'] = 300
+# How many times a chunk whose call failed or whose reply didn't parse is retried (other chunks are unaffected),
+# and the wait before the first retry in seconds (doubled for each retry after that)
+app.config['LLM_CHUNK_RETRIES'] = 2
+app.config['LLM_RETRY_BACKOFF'] = 1.0
+# How prompts are laid out - 'system' (fixed system message, reusable prefix) or 'inline' (instructions in the user message)
+app.config['LLM_PROMPT_LAYOUT'] = 'system'
+# Constrains the model's reply to EVENTS_SCHEMA through Ollama's format parameter (turn off to compare parse failure rates)
+app.config['LLM_SCHEMA_OUTPUT'] = True
+# How long Ollama keeps the model loaded after each call, whether to load it when the app starts,
+# and how long a model load must take for a call to count as a cold start
+app.config['LLM_KEEP_ALIVE'] = '30m'
+app.config['LLM_WARM_ON_STARTUP'] = True
+app.config['LLM_COLD_START_SECONDS'] = 1.0
+
+# LLM response cache - a SQLite file shared by every worker process, capped at this many responses (least recently used go first)
+app.config['LLM_CACHE_ENABLED'] = True
+app.config['LLM_CACHE_PATH'] = os.path.join('cache', 'llm_responses.sqlite3')
+app.config['LLM_CACHE_MAX_ENTRIES'] = 5000
+
+# Google Calendar inserts - events per batch request (the API allows up to 50), and how many times an insert that failed in its
+# batch is retried on its own (with exponential backoff)
+app.config['CALENDAR_BATCH_SIZE'] = 50
+app.config['CALENDAR_RETRIES'] = 3
+# Sends events to the calendar while extraction is still running - a batch goes out once CALENDAR_BATCH_SIZE events are waiting,
+# or CALENDAR_STREAM_INTERVAL seconds after the first of them arrived. Left off when LLM_ESCALATION_MODEL is set, since the larger
+# model can replace events that would already be in the calendar
+app.config['CALENDAR_STREAM_INSERTS'] = True
+app.config['CALENDAR_STREAM_INTERVAL'] = 2.0
+# Token file holding the user's Google credentials, and how close to expiring (in seconds) the access token may get
+# before it is refreshed
+app.config['CALENDAR_TOKEN_FILE'] = 'token.json'
+app.config['CALENDAR_REFRESH_MARGIN'] = 300
+
+# Background upload jobs - how many uploads each server process works on at once, how many finished jobs are kept for
+# /jobs/<id>, and the SQLite file their progress is kept in (shared by every gunicorn worker process, so whichever worker
+# answers /jobs/<id> sees the job)
+app.config['JOB_WORKERS'] = 2
+app.config['JOB_HISTORY'] = 200
+app.config['JOB_STORE_PATH'] = os.path.join('cache', 'jobs.sqlite3')
+
+# Lets any setting above be overridden by FLASK_-prefixed environment variables (e.g., FLASK_EXTRACT_WORKERS=8)
+app.config.from_prefixed_env()
+
+# Ensures uploads and cache folders exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(app.config['PDF_CACHE_FOLDER'], exist_ok=True)
 
 # Google Calendar API Scope
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+# Month, weekday and numeric date patterns used to score how date-heavy a piece of text is
+# (month names only count next to a day number, so words like "may" and "march" aren't matched on their own;
+# "3 May" also can't be followed by another word, so prose like "groups of 3 may work" isn't a date)
+MONTH_NAMES = r'jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?'
+WEEKDAY_NAMES = r'monday|tuesday|wednesday|thursday|friday|saturday|sunday|mon|tues?|wed|thu(?:rs?)?|fri'
+# Slash dates must be a real month/day and not a score or fraction (so "85/100", "15/20", "10/20 points" and "1/2 of the grade"
+# aren't dates)
+SLASH_DATE_REGEX = (r'(?<![\d/])(?:0?[1-9]|1[0-2])/(?:0?[1-9]|[12]\d|3[01])(?:/(?:\d{4}|\d{2}))?(?![\d/])'
+                    r'(?!\s*(?:pts?\b|points?\b|marks?\b|%|of\b))')
+CALENDAR_DATE_REGEX = (rf'(?:{MONTH_NAMES})\.?\s+\d{{1,2}}(?:st|nd|rd|th)?\b'
+                       rf'|\d{{1,2}}(?:st|nd|rd|th)?\s+may\b(?!\s+[a-z])'
+                       rf'|\d{{1,2}}(?:st|nd|rd|th)?\s+(?:{MONTH_NAMES.replace("|may|", "|")})\b'
+                       rf'|{SLASH_DATE_REGEX}'
+                       r'|\d{4}-\d{2}-\d{2}\b')
+# Dates that name a specific day of the year (used to pick out date columns in schedule tables)
+CALENDAR_DATE_PATTERN = re.compile(rf'\b(?:{CALENDAR_DATE_REGEX})', re.IGNORECASE)
+# Any date mention, including bare weekdays (used to score date density)
+DATE_PATTERN = re.compile(rf'\b(?:{CALENDAR_DATE_REGEX}|(?:{WEEKDAY_NAMES})\b)', re.IGNORECASE)
+
+# Schedule table header words - which column holds dates, which holds deliverables, and which holds the lecture topic.
+# Whole words only, so headers like "Updated" or "Residue" don't match
+DATE_HEADER_PATTERN = re.compile(r'\bdates?\b', re.IGNORECASE)
+DUE_HEADER_PATTERN = re.compile(r'\b(?:due|deliverables?|assignments?|assessments?|exams?|events?)\b', re.IGNORECASE)
+TOPIC_HEADER_PATTERN = re.compile(r'\b(?:topics?|subjects?|lectures?|descriptions?|contents?)\b', re.IGNORECASE)
+
+# Words that mark a phrase as a graded deliverable, and the deadline phrasings the rule-based extractor understands, each with
+# its base confidence: "Assignment 3 due Oct 12", "Midterm - 10/20" / "Final Exam: Dec 12", and "Oct 12: Project proposal"
+EVENT_KEYWORD_PATTERN = re.compile(
+    r'\b(?:assignments?|homework|hw|quiz(?:zes)?|exams?|midterms?|finals?|projects?|papers?|essays?|labs?|presentations?'
+    r'|proposals?|reports?|tests?|deadlines?|problem sets?|psets?|drafts?|submissions?)\b', re.IGNORECASE)
+RULE_DATE_REGEX = rf'(?:(?:{WEEKDAY_NAMES})\.?,?\s+)?(?P<date>{CALENDAR_DATE_REGEX})'
+RULE_PATTERNS = [
+    (re.compile(rf'(?:^|(?<=[.;]\s))(?P<event>[^.;\n]{{2,80}}?)\s+(?:is\s+|are\s+)?due\s+(?:on\s+|by\s+)?{RULE_DATE_REGEX}',
+                re.IGNORECASE), 0.9),
+    (re.compile(rf'^(?P<event>[^:\n]{{2,80}}?)(?:\s*:\s*|\s+[-–—]\s+|\s*[–—]\s*){RULE_DATE_REGEX}', re.IGNORECASE), 0.8),
+    (re.compile(rf'^{RULE_DATE_REGEX}(?:\s*:\s*|\s+[-–—]\s+|\s*[–—]\s*|\s+)(?P<event>[^\n]{{2,80}})$', re.IGNORECASE), 0.75),
+]
+
+"""
+# Name: ExtractionLimitError - Extraction Ceiling Exception
+# Desc: Raised when a PDF goes over the configured page or memory ceiling during extraction
+# Precondition: Raised by extract_pdf_pages or a page source wrapped in limit_extraction_memory
+# Postcondition: Message is suitable for flashing to the user
+"""
+class ExtractionLimitError(Exception):
+    pass
+
+
+"""
+# Name: ConfigurationError - Invalid Settings Exception
+# Desc: Raised when the settings contradict each other in a way that would make a stage misbehave instead of just run slowly
+# Precondition: Raised by the function that needs the settings, naming the settings involved
+# Postcondition: Message is suitable for showing to the user and the operator
+"""
+class ConfigurationError(Exception):
+    pass
+
+
+# Process pool for parallel PDF extraction, created on first use and shared by all requests
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+# Process-wide counters reported by the /metrics endpoint
+STATS = {}
+_stats_lock = threading.Lock()
+
+# Model server backend shared by all requests, created on first use
+_llm_backend = None
+_llm_backend_lock = threading.Lock()
+
+# Shared scheduler that every upload's LLM requests go through, started on first use
+_llm_scheduler = None
+_llm_scheduler_lock = threading.Lock()
+
+# Characters per token set by the last explicit recalibration (None uses LLM_CHARS_PER_TOKEN)
+_chars_per_token = None
+_chars_per_token_lock = threading.Lock()
+
+# Guards against starting a second model warm-up while one is already loading the model
+_warmup_lock = threading.Lock()
+_warmup_running = False
+
+# Google credentials per token file, shared by every thread, and each thread's own Calendar services
+_calendar_credentials = {}
+_calendar_credentials_lock = threading.Lock()
+_calendar_local = threading.local()
+
+# Threads that stream each upload's events into the calendar, started on first use. They are long-lived so each keeps its Calendar service
+_calendar_pool = None
+_calendar_pool_lock = threading.Lock()
+
+# Guards the in-process copy of each running job, and the pool that runs the jobs, started on first use
+_jobs_lock = threading.Lock()
+_job_pool = None
+_job_pool_lock = threading.Lock()
+
+"""
+# Name: record_stat - Process Counter Updater
+# Desc: Adds to one of the process-wide counters shown by /metrics
+# Precondition: name is a counter name, amount is a number
+# Postcondition: STATS[name] is increased by amount (starting from 0)
+"""
+def record_stat(name, amount=1):
+    with _stats_lock:
+        STATS[name] = STATS.get(name, 0) + amount
+
+
 """
 # Name: allowed_file - File Type Validator
 # Desc: Validates if the uploaded file has an allowed extension
@@ -56,11 +318,65 @@ def home():
     return render_template('home.html', message=message)
 
 
+"""
+# Name: metrics - Metrics Route Handler
+# Desc: Reports this process's counters (e.g., LLM cache hits and misses) as JSON
+# Precondition: Flask app is running
+# Postcondition: Returns a JSON object of counters, plus derived rates
+"""
+@app.route('/metrics')
+def metrics():
+    with _stats_lock:
+        counters = dict(STATS)
+
+    lookups = counters.get('llm_cache_hits', 0) + counters.get('llm_cache_misses', 0)
+    counters['llm_cache_hit_rate'] = counters.get('llm_cache_hits', 0) / lookups if lookups else None
+    for kind in ('cold', 'warm'):
+        calls = counters.get(f'llm_{kind}_calls', 0)
+        counters[f'llm_{kind}_mean_seconds'] = counters.get(f'llm_{kind}_seconds', 0) / calls if calls else None
+    if _llm_scheduler is not None:
+        counters.update(_llm_scheduler.snapshot())
+    counters['jobs_active'] = count_active_jobs()
+    jobs = counters.get('llm_queue_jobs', 0)
+    counters['llm_queue_mean_wait_seconds'] = counters.get('llm_queue_wait_seconds', 0) / jobs if jobs else None
+    for name, count in (('build', 'calendar_service_builds'), ('refresh', 'calendar_token_refreshes')):
+        calls = counters.get(count, 0)
+        counters[f'calendar_{name}_mean_seconds'] = counters.get(f'calendar_{name}_seconds', 0) / calls if calls else None
+    for layout in PROMPT_VERSIONS:
+        calls = counters.get(f'llm_prompt_eval_calls_{layout}', 0)
+        counters[f'llm_prompt_eval_mean_seconds_{layout}'] = counters.get(f'llm_prompt_eval_seconds_{layout}', 0) / calls if calls else None
+    for mode in ('schema', 'freeform'):
+        replies = counters.get(f'llm_replies_{mode}', 0)
+        counters[f'llm_parse_failure_rate_{mode}'] = counters.get(f'llm_parse_failures_{mode}', 0) / replies if replies else None
+    return jsonify(counters)
+
+
+"""
+# Name: ready - Readiness Route Handler
+# Desc: Reports whether the configured model is currently loaded by the model server (i.e., the next upload won't pay for a cold start)
+# Precondition: Flask app is running
+# Postcondition: Returns JSON with the model's residency - status 200 when resident, 503 when not loaded or the server is unreachable
+"""
+@app.route('/ready')
+def ready():
+    model = app.config['LLM_MODEL']
+    try:
+        details = get_llm_backend().resident_model(model)
+    except Exception as e:
+        return jsonify({'model': model, 'resident': False, 'error': str(e)}), 503
+
+    if details is None:
+        return jsonify({'model': model, 'resident': False}), 503
+    return jsonify({'model': model, 'resident': True, **details})
+
+
 """
 # Name: upload_file - File Upload Route Handler
-# Desc: A comprehensive file upload handler that performs multiple validation checks at each step and provides user feedback through flash messages. 
+# Desc: A comprehensive file upload handler that performs multiple validation checks at each step and provides user feedback through flash messages.
+#       Valid uploads are queued as a background job instead of being processed inside the request
 # Precondition: Flask app is running, UPLOAD_FOLDER is configured, POST request contains file data
-# Postcondition: File is saved to upload folder if valid, or error message is flashed. User is always redirected back to home page.
+# Postcondition: Invalid uploads flash an error and redirect home. Valid ones redirect to the job's page (or, for JSON clients,
+#                return 202 with the job ID) as soon as the job is queued
 """
 # Registers upload_file function as route handler for "/upload" URL, restricts to POST requests only
 @app.route('/upload', methods=['POST'])
@@ -84,37 +400,44 @@ def upload_file():
     
     # Checks that the file exists and it is an allowed file (PDF)
     if file and allowed_file(file.filename):
-        # Cleans the filename up to remove potentially dangerous characters
-        filename = secure_filename(file.filename)
-        # Stores the full path to the uploaded file 
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        # Saves the uploaded file to the uploads folder
-        file.save(filepath)
-
-        # Extracts text from the uploaded PDF
-        text = ""
-        with pdfplumber.open(filepath) as pdf:
-            for page in pdf.pages:
-                # Append text from each page with the newline operator
-                text += page.extract_text() + "\n"
-
-        # Extracts events and dates using Ollama 
-        events_and_dates = extract_events_with_ollama(text)
-
-        # Debug: print to terminal
-        print("---- Detected Events + Dates (Ollama) ----")
-        print(events_and_dates)
-
-        # Adds events to Google Calendar
-        if events_and_dates:
-            added_count = add_events_to_calendar(events_and_dates)
-            flash(f'File uploaded successfully! Added {added_count} events to your calendar.')
+        # Keeps a copy in the uploads folder only if persisting uploads is turned on
+        if app.config['PERSIST_UPLOADS']:
+            # Cleans the filename up to remove potentially dangerous characters
+            filename = secure_filename(file.filename)
+            # Saves the uploaded file to the uploads folder
+            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+
+        # Starts loading the model in the background so it overlaps with PDF extraction
+        start_model_warmup()
+
+        # Uses the extraction engine picked on the form, or the configured default
+        engine = request.form.get('engine') or app.config['EXTRACTION_ENGINE']
+        if engine not in EXTRACTION_ENGINES:
+            flash(f'Unknown extraction engine: {engine}')
+            return redirect(url_for('home'))
+
+        # Bulk submissions queue behind interactive uploads, and each client gets a fair share of the model
+        priority = 'bulk' if request.form.get('priority') == 'bulk' else 'interactive'
+        # Events are tagged with the course so re-uploading the same syllabus doesn't duplicate them (the job falls back to the
+        # PDF's contents when none is entered, since file names are often generic or reused)
+        course = request.form.get('course', '').strip()
+
+        # Gives the job its own copy of the upload, since the request's stream is closed once this request returns - uploads that
+        # fit in UPLOAD_SPOOL_MAX_MEMORY stay in memory, only larger ones (already spilled by UploadRequest) go to a temp file
+        size = file.stream.seek(0, os.SEEK_END)
+        file.stream.seek(0)
+        if size <= app.config['UPLOAD_SPOOL_MAX_MEMORY']:
+            source = io.BytesIO(file.stream.read())
         else:
-            flash('File uploaded but no events were detected.')
+            source = spill_to_temp_file(file.stream)
+        job = create_job(file.filename)
+        get_job_pool().submit(run_upload_job, job, source, engine, priority, request.remote_addr, course)
 
-        # Flashes a success message
-        flash('File uploaded successfully!')
-        return render_template('results.html', text=text, events_and_dates=events_and_dates)
+        # Returns at once - the job page shows progress and then the results
+        status_url = url_for('job_status', job_id=job['id'])
+        if wants_json():
+            return jsonify({'job_id': job['id'], 'status_url': status_url}), 202, {'Location': status_url}
+        return redirect(status_url)
     else:
         # Flashes an error message
         flash('Invalid file type. Please upload a PDF.')
@@ -123,134 +446,2509 @@ def upload_file():
 
 
 """
-# Name: extract_events_with_ollama - AI-Powered Event Extractor
-# Desc: Uses Ollama's llama3.2 model to extract important dates and events from syllabus text
-# Precondition: text is a string containing extracted PDF content, Ollama service is running
-# Postcondition: Returns a list of dictionaries with 'event' and 'date' keys
+# Name: job_status - Job Status Route Handler
+# Desc: Shows a background upload job - a self-refreshing progress page (with the events found so far) while it runs, the results
+#       page once it is done, or its status as JSON for API clients (?format=json or an Accept header preferring JSON)
+# Precondition: Flask app is running, job_id came from /upload
+# Postcondition: Returns the job's page or JSON, unknown or expired jobs redirect home (404 for JSON)
 """
-def extract_events_with_ollama(text):
-    prompt = f"""
-Extract all important academic dates and events from this syllabus.
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        if wants_json():
+            return jsonify({'error': 'Unknown or expired job'}), 404
+        flash('Unknown or expired job')
+        return redirect(url_for('home'))
 
-Return ONLY valid JSON in this EXACT format (no extra text, no explanations):
-[
-  {{"event": "Assignment 1", "date": "September 15"}},
-  {{"event": "Midterm Exam", "date": "October 20"}}
-]
+    if wants_json():
+        # The full text is only worth sending once the job is done
+        return jsonify({name: value for name, value in job.items() if name != 'text' or job['status'] == 'done'})
+    if job['status'] == 'done':
+        return render_template('results.html', text=job['text'], events_and_dates=job['events'], metrics=job['metrics'],
+                               messages=job['messages'])
+    return render_template('job.html', job=job)
+
+
+"""
+# Name: wants_json - JSON Response Check
+# Desc: Decides whether the current request wants JSON rather than a page
+# Precondition: Called inside a request
+# Postcondition: Returns True for ?format=json or an Accept header that prefers JSON over HTML
+"""
+def wants_json():
+    if request.args.get('format') == 'json':
+        return True
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+
+"""
+# Name: extract_syllabus_events - Syllabus Processing Pipeline
+# Desc: Runs every stage between the uploaded PDF and the event list - text extraction (or the text cache), schedule tables,
+#       the date prefilter, the rule-based extractor and finally the LLM for whatever is left
+# Precondition: source is a PDF file path or seekable binary stream, engine is a key of EXTRACTION_ENGINES, metrics is a dict for
+#               processing details, on_event is an optional callable that gets each new event as soon as any stage finds it,
+#               priority/user/failed_sections are passed to extract_events_with_ollama, on_stage is an
+#               optional callable that gets a short description of each stage as it starts, digest is the PDF's SHA-256 if the
+#               caller already has it
+# Postcondition: Returns (full extracted text, de-duplicated list of events). Raises ExtractionLimitError for oversized PDFs
+"""
+def extract_syllabus_events(source, engine, metrics, priority='interactive', user=None, on_event=None, failed_sections=None,
+                            on_stage=None, digest=None):
+    stage = on_stage or (lambda name: None)
+
+    # Extracts text from the PDF (or reuses the cached text of an identical upload). The per-page stages below are chained
+    # generators, so each page is scored, read for tables and scanned by the rules as soon as the engine produces it
+    stage('Extracting text and finding events in tables and dated lines')
+    pages, cache_hit = get_pdf_pages(source, engine, metrics, digest)
+    metrics['Text cache'] = 'hit' if cache_hit else 'miss'
+    read_pages = []
+    pages = collect_pages(score_date_density(pages), read_pages)
+
+    # Reads events straight out of schedule tables, leaving only the text outside them for the LLM
+    table_events = []
+    if app.config['TABLE_EVENTS_ENABLED']:
+        pages = extract_table_events(pages, table_events, metrics)
+
+    # Picks up regularly phrased deadlines with regexes on every page (before the date prefilter, so a lone deadline on a
+    # date-sparse page is still found), leaving the LLM only the lines they couldn't explain
+    rule_events = []
+    rule_dates = {}
+    if app.config['RULES_ENABLED']:
+        pages = extract_events_with_rules_by_page(pages, rule_events, rule_dates, app.config['RULES_MIN_CONFIDENCE'])
+
+    # The prefilter is the first stage that needs every page at once (it keeps them all when none is date-heavy), and chunking
+    # needs the whole LLM text anyway, so the pages are only gathered into a list here
+    llm_pages = list(pages)
+    text = join_page_text(read_pages)
+
+    rules_cover_all = False
+    if app.config['RULES_ENABLED']:
+        coverage = rule_dates['explained'] / rule_dates['dates'] if rule_dates['dates'] else 0.0
+        metrics['Rule-based events'] = f"{len(dedupe_events(rule_events))} events, {coverage:.0%} of calendar dates explained"
+        rules_cover_all = coverage >= app.config['RULES_MIN_COVERAGE']
+
+    # Only sends the date-heavy pages to the LLM, skipping policy boilerplate
+    if app.config['DATE_FILTER_ENABLED']:
+        llm_pages = filter_dated_pages(llm_pages, metrics, keep_all_if_empty=not table_events, total_chars=len(text))
+    llm_text = '' if rules_cover_all else join_page_text(llm_pages)
+    # Measured against the whole extracted text, like the prefilter's share, so the two figures add up
+    metrics['Text left for LLM'] = f"{len(llm_text)} of {len(text)} chars (~{estimate_tokens(llm_text)} tokens)"
+
+    # Passes each event on the first time it is found, whichever stage found it
+    published = set()
+    def publish(event):
+        key = event_key(event)
+        if key not in published:
+            published.add(key)
+            if on_event:
+                on_event(event)
+
+    # Table and rule events are final, so they are passed on before the LLM starts
+    events = dedupe_events(table_events + rule_events)
+    for event in events:
+        publish(event)
+
+    # Extracts events and dates with the LLM, skipped when the tables and rules covered everything
+    if llm_text.strip():
+        stage('Extracting events with the language model')
+        llm_events = extract_events_with_ollama(llm_text, metrics, on_event=publish, priority=priority, user=user,
+                                                failed_sections=failed_sections)
+        events = dedupe_events(events + llm_events)
+
+    return text, events
+
+
+"""
+# Name: get_job_pool - Job Thread Pool Accessor
+# Desc: Lazily creates the thread pool that runs background upload jobs (threads are enough - text extraction has its own process
+#       pool and LLM calls go through the shared scheduler)
+# Precondition: None
+# Postcondition: Returns the shared ThreadPoolExecutor with JOB_WORKERS threads
+"""
+def get_job_pool():
+    global _job_pool
+
+    with _job_pool_lock:
+        if _job_pool is None:
+            _job_pool = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='upload-job')
+    return _job_pool
 
-Rules:
-- Return ONLY the JSON array
-- Each object must have "event" and "date" keys
-- Use proper JSON syntax with commas between objects
-- Include assignments, exams, quizzes, project deadlines
-- Keep event names clear and concise
-- Use readable date format (e.g., "September 15" or "Sept 15")
 
-Syllabus text:
-{text[:3000]}
 """
+# Name: open_job_store - Job Store Connection
+# Desc: Opens a connection to the SQLite job store, creating its tables on first use. Each job is one row holding its state as
+#       JSON, and the events streamed so far are rows of their own so adding one doesn't rewrite the job. WAL mode lets every
+#       worker process read while the job's own worker writes
+# Precondition: JOB_STORE_PATH's folder is writable
+# Postcondition: Returns a new sqlite3 connection (each caller closes its own - connections aren't shared across threads)
+"""
+def open_job_store():
+    path = app.config['JOB_STORE_PATH']
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            finished REAL,
+            state TEXT NOT NULL
+        )
+    """)
+    connection.execute('CREATE TABLE IF NOT EXISTS job_events (job_id TEXT NOT NULL, event TEXT NOT NULL)')
+    connection.execute('CREATE INDEX IF NOT EXISTS job_events_job_id ON job_events (job_id)')
+    return connection
 
+
+"""
+# Name: save_job - Job Writer
+# Desc: Writes a job's current state (everything but its streamed events) to the job store
+# Precondition: job is a job dict from create_job, called with _jobs_lock held
+# Postcondition: The job's row is created or replaced, errors are printed
+"""
+def save_job(job):
+    state = json.dumps({key: value for key, value in job.items() if key != 'partial_events'})
     try:
-        # Sends a request to Ollama
-        response = ollama.chat(model='llama3.2', messages=[{'role': 'user', 'content': prompt}])
+        with closing(open_job_store()) as connection, connection:
+            connection.execute('INSERT OR REPLACE INTO jobs VALUES (?, ?, ?)', (job['id'], job['finished'], state))
+    except sqlite3.Error as e:
+        print(f"Error saving job {job['id']}: {e}")
+
 
-        # Extracts the response text
-        response_text = response['message']['content'].strip()
+"""
+# Name: create_job - Job Creator
+# Desc: Registers a new queued upload job in the job store, dropping the oldest finished jobs past JOB_HISTORY
+# Precondition: filename is the uploaded file's name
+# Postcondition: Returns the job's dict (only change it through update_job and add_job_event)
+"""
+def create_job(filename):
+    job = {
+        'id': uuid.uuid4().hex,
+        'filename': filename,
+        'status': 'queued',
+        'stage': 'Waiting for a worker',
+        'created': time.time(),
+        'finished': None,
+        'partial_events': [],
+        'events': [],
+        'messages': [],
+        'metrics': {},
+        'text': '',
+    }
 
-        # Tries to find JSON array in the response (in case of extra text)
-        json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-        if json_match:
-            response_text = json_match.group()
+    with _jobs_lock:
+        save_job(job)
+    try:
+        with closing(open_job_store()) as connection, connection:
+            connection.execute(
+                'DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE finished IS NOT NULL ORDER BY finished DESC LIMIT -1 OFFSET ?)',
+                (app.config['JOB_HISTORY'],))
+            connection.execute('DELETE FROM job_events WHERE job_id NOT IN (SELECT id FROM jobs)')
+    except sqlite3.Error as e:
+        print(f"Error pruning old jobs: {e}")
+    record_stat('jobs_submitted')
+    return job
 
-        # Parses JSON response
-        events = json.loads(response_text)
-        return events
-    
-    except json.JSONDecodeError as e:
-        print(f"JSON parsing error: {e}")
-        print(f"Response was: {response_text[:500]}")
-        return []
-    except Exception as e:
-        print(f"Error extracting events: {e}")
-        return []
-    
 
 """
-# Name: get_calendar_service - Google Calendar API Authentication
-# Desc: Authenticates user with Google Calendar API and returns an authorized service object for making API calls
-# Precondition: credentials.json exists in project root, Google Calendar API is enabled in Google Cloud Console
-# Postcondition: Returns an authenticated Google Calendar service object, creates/refreshes token.json for future use
+# Name: update_job - Job Updater
+# Desc: Changes a job's fields and writes the whole job back in one statement, so status requests never see a half-updated job
+# Precondition: job came from create_job, fields are job keys
+# Postcondition: The job's fields are updated in memory and in the job store
+"""
+def update_job(job, **fields):
+    with _jobs_lock:
+        job.update(fields)
+        save_job(job)
+
+
+"""
+# Name: get_job - Job Lookup
+# Desc: Reads a job's current state from the job store for a status request, from whichever process is running it
+# Precondition: job_id is any string
+# Postcondition: Returns a copy of the job (safe to read while the job keeps running), or None if there is no such job
+"""
+def get_job(job_id):
+    try:
+        with closing(open_job_store()) as connection:
+            row = connection.execute('SELECT state FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return None
+            events = connection.execute('SELECT event FROM job_events WHERE job_id = ? ORDER BY rowid', (job_id,)).fetchall()
+    except sqlite3.Error as e:
+        print(f"Error reading job {job_id}: {e}")
+        return None
+
+    snapshot = json.loads(row[0])
+    snapshot['partial_events'] = [json.loads(event) for (event,) in events]
+    snapshot['elapsed'] = (snapshot['finished'] or time.time()) - snapshot['created']
+    return snapshot
+
+
+"""
+# Name: count_active_jobs - Active Job Counter
+# Desc: Counts the jobs that haven't finished yet, across every server process
+# Precondition: None
+# Postcondition: Returns the count (0 if the job store can't be read)
+"""
+def count_active_jobs():
+    try:
+        with closing(open_job_store()) as connection:
+            return connection.execute('SELECT COUNT(*) FROM jobs WHERE finished IS NULL').fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"Error counting jobs: {e}")
+        return 0
+
+
 """
-def get_calendar_service():
-    creds = None
+# Name: run_upload_job - Background Upload Job
+# Desc: Runs on the job pool - takes an upload through the whole pipeline (text extraction, event extraction, calendar sync),
+#       publishing the current stage and each event as soon as the model produces it
+# Precondition: job came from create_job, source is the job's own copy of the PDF (an in-memory stream, or a temp file path for
+#               large uploads), course is the entered course name ('' to use the PDF's hash), the rest are the upload's settings
+# Postcondition: Job is 'done' with its text, events, metrics and messages, or 'failed' with an error message. A temp file is deleted
+"""
+def run_upload_job(job, source, engine, priority, user, course):
+    start = time.perf_counter()
+    update_job(job, status='running', stage='Starting')
+    # Tracks details about how the upload was processed, shown on the results page
+    metrics = {'Extraction engine': engine}
+    messages = []
+
+    try:
+        # Sections of the syllabus the LLM couldn't fully extract, reported to the user instead of failing the whole upload
+        failed_sections = []
+        # Hashes the PDF once for both the text cache and, when no course was entered, the course its events are tagged with -
+        # the same syllabus then matches its earlier import whatever the file is called
+        digest = hash_source(source)
+        course = course or digest
+
+        # Signs in to Google Calendar and looks up the course's earlier imports while the PDF is read, then sends each event in
+        # batches as soon as it is found (unless the model cascade may still replace it)
+        calendar = CalendarSync(course, metrics)
+        stream_inserts = app.config['CALENDAR_STREAM_INSERTS'] and not app.config['LLM_ESCALATION_MODEL']
+        def on_event(event):
+            add_job_event(job, event)
+            if stream_inserts:
+                calendar.add(event)
 
-    # Token.json stores the user's access and refresh tokens
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+        try:
+            text, events = extract_syllabus_events(source, engine, metrics, priority=priority, user=user, on_event=on_event,
+                                                   on_stage=lambda stage: update_job(job, stage=stage),
+                                                   failed_sections=failed_sections, digest=digest)
+        except BaseException:
+            # Events already streamed stay in the calendar, the sync thread just stops
+            calendar.close()
+            raise
 
-    # If there are no valid credentials, let the user log in
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+        # Warns about the sections that failed so the user knows to check them by hand
+        messages.extend(f'Could not fully read {section}' for section in failed_sections)
+
+        # Adds the events that weren't streamed to Google Calendar and waits for the streamed batches to finish
+        update_job(job, stage='Adding events to your calendar')
+        added_count, skipped_count = calendar.finish(events)
+        if events:
+            messages.append(f'File processed successfully! Added {added_count} events to your calendar, '
+                            f'skipped {skipped_count} already imported.')
         else:
-            flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-            creds = flow.run_local_server(port=8080)
-        
-        # Saves the credentials for the next run
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-    
-    service = build('calendar', 'v3', credentials=creds)
-    return service
+            messages.append('File processed but no events were detected.')
+
+        update_job(job, status='done', stage='Done', text=text, events=events, metrics=metrics, messages=messages,
+                   finished=time.time())
+        record_stat('jobs_completed')
+    except ExtractionLimitError as e:
+        update_job(job, status='failed', stage='Failed', metrics=metrics, messages=[f'PDF is too large to process: {e}'],
+                   finished=time.time())
+        record_stat('jobs_failed')
+    except Exception as e:
+        print(f"Error processing job {job['id']}: {e}")
+        update_job(job, status='failed', stage='Failed', metrics=metrics, messages=messages + [f'Processing failed: {e}'],
+                   finished=time.time())
+        record_stat('jobs_failed')
+    finally:
+        record_stat('job_seconds', time.perf_counter() - start)
+        if isinstance(source, str):
+            os.remove(source)
+
 
 """
-# Name: add_events_to_calendar - Calendar Event Creator
-# Desc: Takes a list of event dictionaries and adds them to the user's Google Calendar
-# Precondition: events is a list of dicts with 'event' and 'date' keys, user is authenticated with Google Calendar API
-# Postcondition: Creates calendar events for each item in the list, returns count of successfully added events
+# Name: add_job_event - Partial Event Publisher
+# Desc: on_event hook for jobs - makes each streamed event visible on the job's progress page right away
+# Precondition: job came from create_job, event is an event dict (called from the LLM scheduler thread)
+# Postcondition: The event is appended to the job's partial events, in memory and in the job store
+"""
+def add_job_event(job, event):
+    with _jobs_lock:
+        job['partial_events'].append(event)
+    try:
+        with closing(open_job_store()) as connection, connection:
+            connection.execute('INSERT INTO job_events VALUES (?, ?)', (job['id'], json.dumps(event)))
+    except sqlite3.Error as e:
+        print(f"Error saving event for job {job['id']}: {e}")
+
+
+"""
+# Name: rewind - PDF Source Rewinder
+# Desc: Moves a stream source back to its start so each reader sees the whole PDF, paths are passed through untouched
+# Precondition: source is a file path or a seekable binary stream
+# Postcondition: Returns source, positioned at byte 0 if it is a stream
+"""
+def rewind(source):
+    if not isinstance(source, str):
+        source.seek(0)
+    return source
+
+
+"""
+# Name: iter_pdfplumber_pages - Accurate Extraction Engine (pdfplumber)
+# Desc: Opens a PDF with pdfplumber and yields one record per page as soon as that page's text is extracted, using pdfplumber's layout analysis
+# Precondition: source is a PDF file path or seekable binary stream, start/stop are optional 0-based page bounds (stop is exclusive)
+# Postcondition: Yields dicts with 'page' (1-based page number), 'text' and 'chars' keys, closes the PDF when exhausted.
+#                Pages containing tables also get 'tables' (rows of cell strings) and 'text_outside_tables' keys
+"""
+def iter_pdfplumber_pages(source, start=0, stop=None):
+    with pdfplumber.open(rewind(source)) as pdf:
+        for number, page in enumerate(pdf.pages[start:stop], start=start + 1):
+            # extract_text can return None for pages without a text layer
+            page_text = page.extract_text() or ""
+            record = {'page': number, 'text': page_text, 'chars': len(page_text)}
+
+            tables = page.find_tables()
+            if tables:
+                # Crops every table out of the page to get the text around them
+                body = page
+                for table in tables:
+                    body = body.outside_bbox(table.bbox, strict=False)
+                record['tables'] = [table.extract() for table in tables]
+                record['text_outside_tables'] = body.extract_text() or ""
+
+            # Releases the page's cached characters and layout objects so memory doesn't grow with page count
+            page.close()
+            yield record
+
+
+"""
+# Name: iter_pdfium_pages - Fast Extraction Engine (pypdfium2)
+# Desc: Reads each page's text layer straight from PDFium, skipping layout analysis - much faster, but column and table spacing is less faithful
+# Precondition: source is a PDF file path or seekable binary stream, start/stop are optional 0-based page bounds (stop is exclusive)
+# Postcondition: Yields page records in the same shape as iter_pdfplumber_pages, closes the PDF when exhausted
+"""
+def iter_pdfium_pages(source, start=0, stop=None):
+    pdf = pdfium.PdfDocument(rewind(source))
+    try:
+        stop = len(pdf) if stop is None else min(stop, len(pdf))
+        for index in range(start, stop):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            # PDFium separates lines with \r\n, normalised to match pdfplumber's output
+            page_text = textpage.get_text_range().replace('\r\n', '\n')
+            textpage.close()
+            page.close()
+            yield {'page': index + 1, 'text': page_text, 'chars': len(page_text)}
+    finally:
+        pdf.close()
+
+
+# Extraction engines selectable per upload - every engine takes (source, start, stop) and yields page records
+EXTRACTION_ENGINES = {
+    'accurate': iter_pdfplumber_pages,
+    'fast': iter_pdfium_pages,
+}
+
+
+"""
+# Name: count_pdf_pages - PDF Page Counter
+# Desc: Reads the page count with PDFium, which only parses the page tree
+# Precondition: source is a PDF file path or seekable binary stream
+# Postcondition: Returns the number of pages in the PDF
+"""
+def count_pdf_pages(source):
+    pdf = pdfium.PdfDocument(rewind(source))
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+"""
+# Name: spill_to_temp_file - Stream Spiller
+# Desc: Copies a stream source to a named temp file so process pool workers can open the PDF themselves
+# Precondition: source is a seekable binary stream
+# Postcondition: Returns the temp file path, the caller is responsible for deleting it
+"""
+def spill_to_temp_file(source):
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+        shutil.copyfileobj(rewind(source), f)
+        return f.name
+
+
+"""
+# Name: current_rss - Resident Memory Reader
+# Desc: Reads this process's resident set size, from /proc on Linux or the peak from getrusage elsewhere
+# Precondition: None
+# Postcondition: Returns the RSS in bytes (0 if it can't be read on this platform)
+"""
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        if resource is None:
+            return 0
+        # ru_maxrss is in kilobytes on Linux but bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+"""
+# Name: limit_extraction_memory - Extraction Memory Guard
+# Desc: Samples RSS after every page, tracking how far it has grown since the extraction started and stopping the extraction if
+#       it has grown by more than max_memory_mb. RSS is process-wide, so this is only a per-task measure inside an extraction
+#       worker process (one task at a time)
+# Precondition: Runs in an extraction worker process, pages is a page record iterator that hasn't started yet, stats is a dict to
+#               record 'peak_growth' (bytes) in, max_memory_mb is 0 for no limit
+# Postcondition: Yields the page records unchanged, raises ExtractionLimitError when the ceiling is crossed
+"""
+def limit_extraction_memory(pages, stats, max_memory_mb):
+    baseline = current_rss()
+    stats['peak_growth'] = 0
+
+    for page in pages:
+        growth = current_rss() - baseline
+        stats['peak_growth'] = max(stats['peak_growth'], growth)
+        if max_memory_mb and growth > max_memory_mb * 1024 * 1024:
+            raise ExtractionLimitError(f"PDF needs more than {max_memory_mb:.0f} MB of memory to extract (stopped at page {page['page']})")
+        yield page
+
+
+"""
+# Name: extract_page_range - Worker Page Range Extractor
+# Desc: Runs inside a process pool worker - opens the PDF itself and extracts one contiguous range of pages under the memory ceiling
+# Precondition: pdf is a path readable by the worker process or the PDF's bytes, 0 <= start < stop <= page count, engine is a key
+#               of EXTRACTION_ENGINES, max_memory_mb is this task's share of the document's memory ceiling (0 for none)
+# Postcondition: Returns (page records for pages start..stop-1 in page order, memory the task added to the worker in bytes)
+"""
+def extract_page_range(pdf, start, stop, engine, max_memory_mb):
+    stats = {}
+    source = io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf
+    pages = list(limit_extraction_memory(EXTRACTION_ENGINES[engine](source, start, stop), stats, max_memory_mb))
+    return pages, stats['peak_growth']
+
+
+"""
+# Name: get_extract_pool - Extraction Process Pool Accessor
+# Desc: Lazily creates the shared ProcessPoolExecutor sized by the EXTRACT_WORKERS setting
+# Precondition: Called from the Flask process (not from inside a pool worker)
+# Postcondition: Returns the shared process pool, creating it on the first call
+"""
+def get_extract_pool():
+    global _extract_pool
+
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            # Uses 'spawn' so workers don't inherit locks held by the web server's threads
+            _extract_pool = ProcessPoolExecutor(max_workers=app.config['EXTRACT_WORKERS'],
+                                                mp_context=multiprocessing.get_context('spawn'))
+    return _extract_pool
+
+
+"""
+# Name: extract_pdf_pages - Serial/Parallel Extraction Dispatcher
+# Desc: Splits large PDFs into page ranges extracted in parallel by the process pool. Small PDFs are extracted serially - by one
+#       worker task when there is a memory ceiling to enforce, otherwise straight in the server process
+# Precondition: source is a PDF file path or seekable binary stream, engine is a key of EXTRACTION_ENGINES, metrics is the upload's metrics dict
+# Postcondition: Yields page records in page order, whichever mode was used, and records how the document was extracted and the
+#                memory its worker tasks added in metrics. Raises ExtractionLimitError if the PDF is over the page ceiling, or
+#                extracting it goes over the memory ceiling
+"""
+def extract_pdf_pages(source, engine, metrics):
+    workers = app.config['EXTRACT_WORKERS']
+    max_pages = app.config['EXTRACT_MAX_PAGES']
+    max_memory_mb = app.config['EXTRACT_MAX_MEMORY_MB']
+
+    # Counts the pages first so oversized PDFs are rejected up front and small documents can skip the pool overhead
+    page_count = count_pdf_pages(source)
+    if max_pages and page_count > max_pages:
+        raise ExtractionLimitError(f"PDF has {page_count} pages, the limit is {max_pages}")
+
+    # Without a memory ceiling, small documents skip the pool and are extracted page by page in the server process
+    serial = workers <= 1 or page_count < app.config['EXTRACT_PARALLEL_MIN_PAGES']
+    if serial and not max_memory_mb:
+        yield from EXTRACTION_ENGINES[engine](source)
+        metrics['Extraction'] = 'serial, in the server process (no memory ceiling)'
+        return
+
+    if serial:
+        # The server process's memory is shared with every other upload, so a small document is extracted by one worker task to
+        # keep the ceiling enforceable - an in-memory upload is sent as bytes rather than spilled to disk
+        ranges = [(0, page_count)]
+        pdf = source if isinstance(source, str) else rewind(source).read()
+    else:
+        # Workers can't share an in-memory stream, so it is spilled to a temp file they can each open
+        step = app.config['EXTRACT_PAGES_PER_TASK']
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        pdf = source if isinstance(source, str) else spill_to_temp_file(source)
+
+    # Up to this many of the document's ranges run at once, each limited to an equal share of the ceiling so that together they
+    # stay under it
+    concurrency = max(1, min(workers, len(ranges)))
+    task_memory_mb = max_memory_mb / concurrency if max_memory_mb else 0
+
+    # Submits one task per page range, each worker opens the PDF on its own
+    pool = get_extract_pool()
+    futures = [pool.submit(extract_page_range, pdf, start, stop, engine, task_memory_mb) for start, stop in ranges]
+
+    try:
+        # Waits on the tasks in submission order so pages come back in order, adding up the memory each one needed
+        growth = 0
+        for future in futures:
+            pages, task_growth = future.result()
+            growth += task_growth
+            if max_memory_mb and growth > max_memory_mb * 1024 * 1024:
+                raise ExtractionLimitError(f"PDF needs more than {max_memory_mb} MB of memory to extract "
+                                           f"(stopped at page {pages[-1]['page']})")
+            yield from pages
+        metrics['Extraction'] = f"{len(ranges)} worker task{'s' if len(ranges) != 1 else ''}, up to {concurrency} at once"
+        metrics['Memory added during extraction'] = f"{growth / (1024 * 1024):.0f} MB across all worker tasks"
+    finally:
+        # Drops any ranges that haven't started if the consumer stops early or a worker fails
+        for future in futures:
+            future.cancel()
+        if isinstance(pdf, str) and pdf is not source:
+            # Waits for running ranges to finish with the temp file before deleting it
+            for future in futures:
+                if not future.cancelled():
+                    future.exception()
+            os.remove(pdf)
+
+
+"""
+# Name: hash_source - PDF Content Hasher
+# Desc: Computes the SHA-256 of a PDF's bytes in fixed-size blocks so large uploads aren't read into memory at once
+# Precondition: source is a file path or seekable binary stream
+# Postcondition: Returns the hex digest of the contents, a stream source is left rewound for the extractors
+"""
+def hash_source(source):
+    digest = hashlib.sha256()
+    f = open(source, 'rb') if isinstance(source, str) else rewind(source)
+    try:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    finally:
+        if f is not source:
+            f.close()
+    rewind(source)
+    return digest.hexdigest()
+
+
+"""
+# Name: load_cached_pages - Text Cache Lookup
+# Desc: Reads the cached page records for a file hash and extraction engine and marks the entry as recently used
+# Precondition: digest is a SHA-256 hex digest of an uploaded file, engine is the extraction engine name
+# Postcondition: Returns the list of page records on a hit, None on a miss or unreadable entry
+"""
+def load_cached_pages(digest, engine):
+    path = os.path.join(app.config['PDF_CACHE_FOLDER'], f'{digest}-{engine}-v{PAGE_RECORD_VERSION}.json')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            pages = json.load(f)
+        # Bumps the modification time so LRU eviction treats this entry as fresh
+        os.utime(path)
+        return pages
+    except (OSError, ValueError):
+        return None
+
+
 """
-def add_events_to_calendar(events):
+# Name: store_cached_pages - Text Cache Writer
+# Desc: Writes page records for a file hash and extraction engine to the cache, then evicts old entries if the cache is over its size limit
+# Precondition: digest is a SHA-256 hex digest, engine is the extraction engine name, pages is a list of page records
+# Postcondition: Cache entry is written atomically (readers never see a partial file)
+"""
+def store_cached_pages(digest, engine, pages):
+    folder = app.config['PDF_CACHE_FOLDER']
+    path = os.path.join(folder, f'{digest}-{engine}-v{PAGE_RECORD_VERSION}.json')
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
     try:
-        service = get_calendar_service()
-        added_count = 0
-        
-        for item in events:
-            event_name = item.get('event', 'Untitled Event')
-            date_str = item.get('date', '')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(pages, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Error writing text cache: {e}")
+        return
 
+    evict_pdf_cache()
+
+
+"""
+# Name: evict_pdf_cache - Text Cache LRU Eviction
+# Desc: Deletes the least recently used cache entries until the cache fits within PDF_CACHE_MAX_BYTES
+# Precondition: PDF_CACHE_FOLDER exists
+# Postcondition: Total size of cache entries is at or below the configured limit
+"""
+def evict_pdf_cache():
+    folder = app.config['PDF_CACHE_FOLDER']
+    entries = []
+    for entry in os.scandir(folder):
+        if entry.name.endswith('.json'):
             try:
-                # Parses the date with the current year - dateutil handles format variations
-                event_date = date_parser.parse(f"{date_str} {datetime.now().year}")         
-            except Exception as e:
-                print(f"Error parsing date: {date_str}")
+                stat = entry.stat()
+            except FileNotFoundError:
                 continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    # Oldest (least recently used) entries are removed first
+    for _, size, path in sorted(entries):
+        if total <= app.config['PDF_CACHE_MAX_BYTES']:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Another worker already evicted it
+            pass
+        total -= size
+
+
+"""
+# Name: cache_pages_as_extracted - Caching Page Pass-Through
+# Desc: Passes page records through to the consumer unchanged and stores them in the text cache once every page has been seen
+# Precondition: digest is the SHA-256 of the PDF, engine is the extraction engine name, pages is an iterable of page records
+# Postcondition: Yields each page record, writes the cache entry only if the extraction finished
+"""
+def cache_pages_as_extracted(digest, engine, pages):
+    seen = []
+    for page in pages:
+        seen.append(page)
+        yield page
+    store_cached_pages(digest, engine, seen)
+
+
+"""
+# Name: get_pdf_pages - Cached PDF Page Source
+# Desc: Looks the PDF up in the text cache by the SHA-256 of its bytes, only running the extraction engine on a miss
+# Precondition: source is a PDF file path or seekable binary stream, engine is a key of EXTRACTION_ENGINES, metrics is the upload's metrics dict,
+#               digest is the source's hash_source digest if already computed
+# Postcondition: Returns (page record iterator, cache_hit) - a hit never opens the PDF
+"""
+def get_pdf_pages(source, engine, metrics, digest=None):
+    digest = digest or hash_source(source)
+
+    # Engines produce different text for the same file, so each engine has its own cache entry
+    cached = load_cached_pages(digest, engine)
+    if cached is not None:
+        return iter(cached), True
+
+    return cache_pages_as_extracted(digest, engine, extract_pdf_pages(source, engine, metrics)), False
+
+
+"""
+# Name: score_date_density - Page Date Scorer
+# Desc: Counts date mentions (month/day, weekdays, numeric dates) on each page as the pages stream past
+# Precondition: pages is an iterable of page records
+# Postcondition: Yields copies of the page records with added 'dates' (match count) and 'density' (matches per 1000 chars) keys
+"""
+def score_date_density(pages):
+    for page in pages:
+        dates = sum(1 for _ in DATE_PATTERN.finditer(page['text']))
+        density = dates * 1000 / page['chars'] if page['chars'] else 0.0
+        # Copies the record so cached page records aren't modified
+        yield dict(page, dates=dates, density=density)
+
+
+"""
+# Name: find_table_columns - Schedule Table Column Finder
+# Desc: Works out which column of a table holds dates and which holds the event name, using the header row when there is one
+# Precondition: rows is a list of rows (lists of cell strings, with None for empty cells)
+# Postcondition: Returns (body rows, date column, event column, whether the event column is a deliverables column), or None if the
+#                table isn't a dated schedule
+"""
+def find_table_columns(rows):
+    width = max((len(row) for row in rows), default=0)
+    if len(rows) < 2 or width < 2:
+        return None
+
+    # Treats the first row as a header if it has no dates in it
+    header = [cell or '' for cell in rows[0]] + [''] * (width - len(rows[0]))
+    has_header = not any(CALENDAR_DATE_PATTERN.search(cell) for cell in header)
+    body = rows[1:] if has_header else rows
+    if not has_header:
+        header = [''] * width
+
+    # Counts how many body cells in each column contain a calendar date
+    date_hits = [0] * width
+    filled = [0] * width
+    text_length = [0] * width
+    for row in body:
+        for index, cell in enumerate(row):
+            if cell and cell.strip():
+                filled[index] += 1
+                text_length[index] += len(cell)
+                if CALENDAR_DATE_PATTERN.search(cell):
+                    date_hits[index] += 1
+
+    # The date column is the one labelled "date", or failing that the one where most filled cells hold a date
+    date_column = next((index for index, name in enumerate(header) if DATE_HEADER_PATTERN.search(name)), None)
+    if date_column is None:
+        date_column = max(range(width), key=lambda index: date_hits[index])
+        if not filled[date_column] or date_hits[date_column] * 2 < filled[date_column]:
+            return None
+
+    # Prefers a deliverables column, then a topic column, then whichever other column has the most text
+    others = [index for index in range(width) if index != date_column and filled[index]]
+    if not others:
+        return None
+    event_column = next((index for index in others if DUE_HEADER_PATTERN.search(header[index])), None)
+    if event_column is not None:
+        return body, date_column, event_column, True
+    event_column = next((index for index in others if TOPIC_HEADER_PATTERN.search(header[index])), None)
+    if event_column is None:
+        event_column = max(others, key=lambda index: text_length[index])
+
+    return body, date_column, event_column, False
+
+
+"""
+# Name: table_rows_to_events - Schedule Row Converter
+# Desc: Turns each row of a recognised schedule table into an event/date pair without calling the LLM. When the event column isn't a
+#       deliverables column (e.g., lecture topics), only cells naming a deliverable or exam become events - the other dated rows are
+#       returned for the LLM to read, since most are just the day's topic
+# Precondition: body, date_column, event_column and deliverables come from find_table_columns
+# Postcondition: Returns (list of dictionaries with 'event' and 'date' keys, dated rows left for the LLM). Rows without a date or
+#                event are skipped
+"""
+def table_rows_to_events(body, date_column, event_column, deliverables=True):
+    events = []
+    unmatched = []
+    for row in body:
+        date_cell = row[date_column] if date_column < len(row) else None
+        event_cell = row[event_column] if event_column < len(row) else None
+        date_match = CALENDAR_DATE_PATTERN.search(date_cell or '')
+        if not date_match or not event_cell or not event_cell.strip():
+            continue
+        if not deliverables and not EVENT_KEYWORD_PATTERN.search(event_cell):
+            unmatched.append(row)
+            continue
+        # Cells spanning several lines are joined back into one name
+        events.append({'event': ' '.join(event_cell.split()), 'date': date_match.group()})
+    return events, unmatched
+
+
+"""
+# Name: extract_table_events - Table-Aware Schedule Extraction
+# Desc: Converts every recognised schedule table into events as the pages stream past, yielding the page records the LLM still
+#       needs to read
+# Precondition: pages is an iterable of scored page records, events is a list to add the table events to, metrics is the upload's
+#               metrics dict
+# Postcondition: Yields page records for the LLM - recognised tables are removed from the LLM's text, unrecognised tables are kept
+#                as plain rows. Once exhausted, events holds the table events and metrics the table stats
+"""
+def extract_table_events(pages, events, metrics):
+    found = len(events)
+    recognised = 0
+
+    for page in pages:
+        if not page.get('tables'):
+            yield page
+            continue
+
+        leftover = [page['text_outside_tables']]
+        for rows in page['tables']:
+            columns = find_table_columns(rows)
+            if columns:
+                table_events, unmatched = table_rows_to_events(*columns)
+                events.extend(table_events)
+                # Topic rows that don't name a deliverable still go to the LLM, in case the topic hides one
+                leftover.extend(' | '.join(cell or '' for cell in row) for row in unmatched)
+                recognised += 1
+            else:
+                # Tables that aren't schedules are handed to the LLM as plain text rows
+                leftover.extend(' | '.join(cell or '' for cell in row) for row in rows)
+
+        leftover_text = '\n'.join(leftover)
+        yield from score_date_density([{'page': page['page'], 'text': leftover_text, 'chars': len(leftover_text)}])
+
+    metrics['Schedule tables'] = f"{recognised} recognised, {len(events) - found} events read without the LLM"
+
+
+"""
+# Name: filter_dated_pages - Date Density Prefilter
+# Desc: Keeps only pages whose date density reaches DATE_FILTER_MIN_DENSITY and records how much text was dropped
+# Precondition: pages is a list of page records from score_date_density, metrics is the upload's metrics dict, total_chars is the
+#               length of the whole extracted text (defaults to the length of pages) so the dropped share has the same base as the
+#               other text stats
+# Postcondition: Returns the kept pages in order (all pages if none qualify and keep_all_if_empty is set), adds prefilter stats to metrics
+"""
+def filter_dated_pages(pages, metrics, keep_all_if_empty=True, total_chars=None):
+    kept = [page for page in pages if page['dates'] and page['density'] >= app.config['DATE_FILTER_MIN_DENSITY']]
+
+    # A syllabus with no date-heavy pages is sent whole rather than not at all (unless its dates already came from tables)
+    if not kept and keep_all_if_empty:
+        kept = pages
+
+    if total_chars is None:
+        total_chars = sum(page['chars'] for page in pages)
+    kept_pages = {id(page) for page in kept}
+    dropped_text = join_page_text(page for page in pages if id(page) not in kept_pages)
+    metrics['Date prefilter'] = f"kept {len(kept)} of {len(pages)} pages"
+    metrics['Text dropped before LLM'] = f"{len(dropped_text)} of {total_chars} chars (~{estimate_tokens(dropped_text)} tokens)"
+    return kept
+
+
+"""
+# Name: extract_events_with_rules - Rule-Based Event Extractor
+# Desc: Finds regularly phrased deadlines line by line with RULE_PATTERNS, without calling the LLM. Each event gets a confidence
+#       score from the phrasing, whether it names a known deliverable, and whether the date is numeric (month/day order is a guess).
+#       Matches below min_confidence are dropped and their dates count as unexplained, so those lines are left for the LLM
+# Precondition: text is a string of syllabus text, min_confidence is between 0 and 1
+# Postcondition: Returns (de-duplicated list of dicts with 'event', 'date' and 'confidence' keys, the text the rules couldn't explain
+#                with one line of context either side, share of calendar dates explained)
+"""
+def extract_events_with_rules(text, min_confidence=0.0):
+    lines = text.split('\n')
+    events = []
+    unexplained = set()
+    total_dates = 0
+    explained_dates = 0
+    year = datetime.now().year
+
+    for index, line in enumerate(lines):
+        dates = [match.start() for match in CALENDAR_DATE_PATTERN.finditer(line)]
+        if not dates:
+            continue
+        total_dates += len(dates)
+
+        date_spans = []
+        for pattern, base_confidence in RULE_PATTERNS:
+            for match in pattern.finditer(line.strip()):
+                # Each date is only claimed by the most confident phrasing that matched it
+                if any(start <= match.start('date') < end for start, end in date_spans):
+                    continue
+
+                event = re.sub(r'^[\W_]+', '', match.group('event')).strip()
+                has_keyword = EVENT_KEYWORD_PATTERN.search(event)
+                # Without the word "due", only phrases naming a known deliverable count as events
+                if not event or (not has_keyword and base_confidence < 0.9):
+                    continue
+                try:
+                    date_parser.parse(f"{match.group('date')} {year}")
+                except (ValueError, OverflowError):
+                    continue
+
+                confidence = round(base_confidence - (0 if has_keyword else 0.15) - (0.05 if '/' in match.group('date') else 0), 2)
+                # Too unsure to skip the LLM - the date stays unexplained so its line is sent on
+                if confidence < min_confidence:
+                    continue
+                events.append({'event': ' '.join(event.split()), 'date': match.group('date'), 'confidence': confidence})
+                date_spans.append(match.span('date'))
+
+        # Date positions are relative to the stripped line the patterns ran on
+        offset = len(line) - len(line.lstrip())
+        explained = sum(1 for position in dates if any(start <= position - offset < end for start, end in date_spans))
+        explained_dates += explained
+        if explained < len(dates):
+            unexplained.add(index)
+
+    # Nothing the scanner recognises as a date - the LLM gets the whole text
+    if not total_dates:
+        return [], text, 0.0
+
+    keep = sorted({number for index in unexplained for number in (index - 1, index, index + 1) if 0 <= number < len(lines)})
+    leftover = '\n'.join(lines[number] for number in keep)
+    return dedupe_events(events), leftover, explained_dates / total_dates
+
+
+"""
+# Name: extract_events_with_rules_by_page - Page-Wise Rule-Based Extractor
+# Desc: Runs extract_events_with_rules on each page as the pages stream past, so pages keep their date density scores for the
+#       prefilter while their text is cut down to the lines the rules couldn't explain
+# Precondition: pages is an iterable of page records scored by score_date_density, events is a list to add the rule events to,
+#               tally is a dict for the date counts, min_confidence is passed to extract_events_with_rules
+# Postcondition: Yields the page records with the leftover text. Once exhausted, events holds the rule events and tally 'dates' and
+#                'explained' (calendar dates found and explained)
+"""
+def extract_events_with_rules_by_page(pages, events, tally, min_confidence=0.0):
+    for key in ('dates', 'explained'):
+        tally.setdefault(key, 0)
+
+    for page in pages:
+        page_events, leftover, coverage = extract_events_with_rules(page['text'], min_confidence)
+        dates = sum(1 for line in page['text'].split('\n') for _ in CALENDAR_DATE_PATTERN.finditer(line))
+        tally['dates'] += dates
+        tally['explained'] += round(coverage * dates)
+        events.extend(page_events)
+        # Keeps the page's original date scores, so the prefilter still judges the page as a whole
+        yield dict(page, text=leftover, chars=len(leftover))
+
+
+"""
+# Name: collect_pages - Page Recorder
+# Desc: Passes page records through unchanged while keeping a copy of each, for the full text shown with the results
+# Precondition: pages is an iterable of page records, seen is a list
+# Postcondition: Yields every page, seen holds them all once exhausted
+"""
+def collect_pages(pages, seen):
+    for page in pages:
+        seen.append(page)
+        yield page
+
+
+"""
+# Name: join_page_text - Page Text Joiner
+# Desc: Builds the full document text from page records with a single join instead of repeated string concatenation
+# Precondition: pages is an iterable (list or generator) of page records from an extraction engine
+# Postcondition: Returns the text of every page, each followed by a newline
+"""
+def join_page_text(pages):
+    return "".join(page['text'] + "\n" for page in pages)
+
+
+# Prompt version of each prompt layout - part of the LLM cache key, so bump a layout's version whenever its prompt changes.
+# 'inline' sends EXTRACTION_PROMPT as one user message with the instructions in front of the text, 'system' sends SYSTEM_PROMPT
+# as a fixed system message and each chunk as its own user message, so Ollama can reuse the cached prefix across calls
+PROMPT_VERSIONS = {'inline': 1, 'system': 2}
+
+# JSON schema passed to Ollama's format parameter - the model can only generate an array of {event, date} objects
+EVENTS_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'event': {'type': 'string'},
+            'date': {'type': 'string'},
+        },
+        'required': ['event', 'date'],
+        'additionalProperties': False,
+    },
+}
+
+# Instructions sent to the model ahead of each chunk of syllabus text
+EXTRACTION_PROMPT = """
+Extract all important academic dates and events from this syllabus.
+
+Return ONLY valid JSON in this EXACT format (no extra text, no explanations):
+[
+  {{"event": "Assignment 1", "date": "September 15"}},
+  {{"event": "Midterm Exam", "date": "October 20"}}
+]
+
+Rules:
+- Return ONLY the JSON array
+- Each object must have "event" and "date" keys
+- Use proper JSON syntax with commas between objects
+- Include assignments, exams, quizzes, project deadlines
+- Keep event names clear and concise
+- Use readable date format (e.g., "September 15" or "Sept 15")
+
+Syllabus text:
+{text}
+"""
+
+# Instructions and few-shot example sent as the system message with the 'system' prompt layout - identical on every call
+SYSTEM_PROMPT = """
+You extract important academic dates and events from the syllabus text the user sends.
+
+Return ONLY a valid JSON array (no extra text, no explanations) of objects with "event" and "date" keys.
+
+Rules:
+- Include assignments, exams, quizzes, project deadlines
+- Keep event names clear and concise
+- Use readable date format (e.g., "September 15" or "Sept 15")
+- Return [] if the text has no dated events
+
+Example syllabus text:
+Week 3 - Sept 15: Homework 2 due at midnight
+Oct 20 (Tue): Midterm Exam in class
+Office hours are Mondays 2-4pm.
+
+Example reply:
+[{"event": "Homework 2", "date": "September 15"}, {"event": "Midterm Exam", "date": "October 20"}]
+"""
+
+
+"""
+# Name: build_prompt_messages - Chat Message Builder
+# Desc: Builds the chat messages for one chunk in the given prompt layout (see PROMPT_VERSIONS)
+# Precondition: chunk is a string of syllabus text, layout is a key of PROMPT_VERSIONS
+# Postcondition: Returns a list of chat message dicts ready for LLMBackend.stream_chat
+"""
+def build_prompt_messages(chunk, layout):
+    if layout == 'inline':
+        return [{'role': 'user', 'content': EXTRACTION_PROMPT.format(text=chunk)}]
+    return [{'role': 'system', 'content': SYSTEM_PROMPT}, {'role': 'user', 'content': chunk}]
+
+
+"""
+# Name: estimate_tokens - Token Estimator
+# Desc: Cheap token count estimate from the character count, using the current characters-per-token ratio
+# Precondition: text is a string
+# Postcondition: Returns the estimated number of tokens (rounded up)
+"""
+def estimate_tokens(text):
+    return math.ceil(len(text) / chars_per_token())
+
+
+"""
+# Name: chars_per_token - Token Estimator Ratio
+# Desc: The characters-per-token ratio in use - the last explicit recalibration, or LLM_CHARS_PER_TOKEN
+# Precondition: None
+# Postcondition: Returns the ratio (a multiple of 0.25)
+"""
+def chars_per_token():
+    with _chars_per_token_lock:
+        ratio = _chars_per_token
+    return ratio or app.config['LLM_CHARS_PER_TOKEN']
+
+
+"""
+# Name: calibrate_token_estimate - Token Estimator Calibration
+# Desc: Sets the characters-per-token ratio from a prompt the model evaluated in full. The ratio is rounded to a multiple of 0.25
+#       so measurements that differ by noise give the same ratio (and so the same chunk boundaries)
+# Precondition: prompt_chars is the length of a prompt with no cached prefix, prompt_tokens is the call's prompt_eval_count
+# Postcondition: Returns the new ratio used by estimate_tokens and pack_chunks (unchanged, and None returned, without a token count)
+"""
+def calibrate_token_estimate(prompt_chars, prompt_tokens):
+    global _chars_per_token
+
+    if not prompt_tokens:
+        return None
+    ratio = max(0.25, round(prompt_chars / prompt_tokens * 4) / 4)
+    with _chars_per_token_lock:
+        _chars_per_token = ratio
+    return ratio
+
+
+"""
+# Name: measure_chars_per_token - Explicit Token Estimator Recalibration
+# Desc: Sends sample text to the model once, behind a random marker so no part of the prompt can be served from the server's prompt
+#       cache, and recalibrates the estimator from the token count of that fully evaluated prompt
+# Precondition: sample_text is a few thousand characters of representative syllabus text, the model server is running
+# Postcondition: Returns the new ratio, or None if the backend doesn't report prompt token counts
+"""
+def measure_chars_per_token(sample_text):
+    content = f"[{uuid.uuid4().hex}]\n{sample_text}"
+
+    async def count_prompt_tokens():
+        stream = get_llm_backend().stream_chat(app.config['LLM_MODEL'], [{'role': 'user', 'content': content}],
+                                               options={'num_ctx': app.config['LLM_NUM_CTX'], 'num_predict': 1})
+        tokens = 0
+        async for part in stream:
+            if part['done']:
+                tokens = part['prompt_eval_count']
+        return tokens
+
+    # Runs on the scheduler's loop, where the backend's async client lives
+    tokens = get_llm_scheduler().submit(count_prompt_tokens, 'interactive', 'calibration').result()
+    ratio = calibrate_token_estimate(len(content), tokens)
+    if ratio is None:
+        print("Backend reported no prompt token count, token estimator left unchanged")
+    return ratio
+
+
+"""
+# Name: prompt_token_budget - Per-Prompt Token Budget
+# Desc: Works out how many tokens of syllabus text fit in one prompt - the context window minus the reply reserve and the instructions
+# Precondition: None
+# Postcondition: Returns the token budget for the syllabus text in each prompt. Raises ConfigurationError when LLM_NUM_CTX leaves no
+#                room for the text, which would otherwise split the syllabus into thousands of tiny chunks
+"""
+def prompt_token_budget():
+    instructions = sum(estimate_tokens(message['content']) for message in build_prompt_messages('', app.config['LLM_PROMPT_LAYOUT']))
+    # Leaves a small margin for the chat template's own tokens and estimation error
+    margin = app.config['LLM_NUM_CTX'] // 20
+    budget = app.config['LLM_NUM_CTX'] - app.config['LLM_OUTPUT_TOKENS'] - instructions - margin
+    # Anything smaller than the chunk overlap can't make progress through the text
+    if budget <= app.config['LLM_CHUNK_OVERLAP_TOKENS']:
+        raise ConfigurationError(f"LLM_NUM_CTX ({app.config['LLM_NUM_CTX']}) leaves {budget} tokens per prompt for syllabus text "
+                                 f"after LLM_OUTPUT_TOKENS ({app.config['LLM_OUTPUT_TOKENS']}), ~{instructions} tokens of "
+                                 f"instructions and a {margin} token margin - it must leave more than LLM_CHUNK_OVERLAP_TOKENS "
+                                 f"({app.config['LLM_CHUNK_OVERLAP_TOKENS']})")
+    return budget
+
+
+"""
+# Name: pack_chunks - Token Budget Prompt Packer
+# Desc: Packs whole lines of text into chunks that each fill the prompt up to budget_tokens, repeating up to overlap_tokens worth
+#       of each chunk's last lines at the start of the next so an event that straddles a boundary appears whole in one chunk
+# Precondition: text is a string, budget_tokens > overlap_tokens >= 0
+# Postcondition: Returns a list of chunk strings covering the whole text in order (empty list for blank text)
+"""
+def pack_chunks(text, budget_tokens, overlap_tokens):
+    ratio = chars_per_token()
+    budget_chars = int(budget_tokens * ratio)
+    overlap_chars = int(overlap_tokens * ratio)
+
+    # Breaks up any line too long to fit in a prompt on its own
+    lines = []
+    for line in text.split('\n'):
+        while len(line) >= budget_chars:
+            lines.append(line[:budget_chars - 1])
+            line = line[budget_chars - 1:]
+        lines.append(line)
+
+    chunks = []
+    current = []
+    used = 0
+    for line in lines:
+        cost = len(line) + 1
+        if current and used + cost > budget_chars:
+            chunks.append('\n'.join(current) + '\n')
+
+            # Carries the last lines over into the next chunk, as long as the next line still fits alongside them
+            carry = []
+            carried = 0
+            for previous in reversed(current):
+                if carried + len(previous) + 1 > overlap_chars or carried + len(previous) + 1 + cost > budget_chars:
+                    break
+                carry.insert(0, previous)
+                carried += len(previous) + 1
+            current, used = carry, carried
+
+        current.append(line)
+        used += cost
+
+    if current and ''.join(current).strip():
+        chunks.append('\n'.join(current) + '\n')
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+"""
+# Name: dedupe_events - Event De-duplicator
+# Desc: Merges event lists from overlapping chunks (and tables), dropping repeats of the same event on the same date
+# Precondition: events is a list of dicts with 'event' and 'date' keys
+# Postcondition: Returns the events in first-seen order with duplicates removed
+"""
+def dedupe_events(events):
+    seen = set()
+    unique = []
+
+    for item in events:
+        key = event_key(item)
+        if key not in seen:
+            seen.add(key)
+            unique.append(item)
+
+    return unique
+
+
+"""
+# Name: event_key - Event Identity Key
+# Desc: Normalises an event into the key used to spot duplicates - lower-cased name and month/day of the date
+# Precondition: item is a dict with 'event' and 'date' keys
+# Postcondition: Returns a hashable (name, date) tuple
+"""
+def event_key(item):
+    name = ' '.join(str(item.get('event', '')).lower().split())
+    date_str = str(item.get('date', ''))
+    try:
+        # Compares dates by month and day so "Sept 15" and "September 15th" match
+        date_key = date_parser.parse(date_str, default=datetime(2000, 1, 1)).strftime('%m-%d')
+    except (ValueError, OverflowError):
+        date_key = ' '.join(date_str.lower().split())
+    return name, date_key
+
+
+"""
+# Name: find_ollama_model - Ollama Model List Lookup
+# Desc: Finds the configured model in a model list from Ollama's list or ps calls
+# Precondition: entries is the 'models' list of an Ollama list/ps response, model is a model name
+# Postcondition: Returns the matching entry, or None if the model isn't listed
+"""
+def find_ollama_model(entries, model):
+    # Ollama reports untagged models with an explicit ':latest' tag
+    names = {model, f'{model}:latest'}
+    return next((entry for entry in entries if (entry.get('model') or entry.get('name')) in names), None)
+
+
+"""
+# Name: LLMBackend - LLM Backend Interface
+# Desc: Everything the pipeline needs from a model server. stream_chat is an async generator of plain dicts -
+#       {'content': next piece of the reply, 'done': False}, then a final {'content': '', 'done': True} part that also carries
+#       'load_duration', 'prompt_eval_count', 'prompt_eval_duration' and 'eval_count' (durations in nanoseconds, 0 when unknown)
+# Precondition: Subclasses implement stream_chat, the other methods have safe defaults. config is app.config
+# Postcondition: One instance is shared by every request. stream_chat is only ever called from the scheduler's event loop
+"""
+class LLMBackend(ABC):
+    def __init__(self, config):
+        self.config = config
+
+    @abstractmethod
+    async def stream_chat(self, model, messages, schema=None, options=None):
+        # Async generator - subclasses yield the reply parts described above
+        yield {}
+
+    def model_digest(self, model):
+        # Identifies the exact model weights for the response cache - None turns the cache off
+        return None
+
+    def warm(self, model):
+        # Loads the model, returning the seconds spent loading it
+        return 0.0
+
+    def resident_model(self, model):
+        # Returns details about the model if it is loaded (an empty dict if there are none), None if it isn't
+        return {}
+
+
+"""
+# Name: OllamaBackend - Ollama LLM Backend
+# Desc: Talks to an Ollama server (LLM_BASE_URL, or Ollama's default host), passing LLM_KEEP_ALIVE on every call
+# Precondition: Ollama service is running
+# Postcondition: Implements LLMBackend with Ollama's own digest, load and residency information
+"""
+class OllamaBackend(LLMBackend):
+    def __init__(self, config):
+        super().__init__(config)
+        self.host = config['LLM_BASE_URL'] or None
+        self.client = ollama.Client(host=self.host)
+        # Created on first use, on the scheduler's event loop
+        self.async_client = None
+
+    async def stream_chat(self, model, messages, schema=None, options=None):
+        if self.async_client is None:
+            self.async_client = ollama.AsyncClient(host=self.host)
+
+        stream = await self.async_client.chat(model=model, messages=messages, stream=True, format=schema or '',
+                                              keep_alive=self.config['LLM_KEEP_ALIVE'], options=options)
+        async for part in stream:
+            yield {
+                'content': part['message']['content'],
+                'done': bool(part.get('done')),
+                'load_duration': part.get('load_duration') or 0,
+                'prompt_eval_count': part.get('prompt_eval_count') or 0,
+                'prompt_eval_duration': part.get('prompt_eval_duration') or 0,
+                'eval_count': part.get('eval_count') or 0,
+            }
+
+    def model_digest(self, model):
+        try:
+            entry = find_ollama_model(self.client.list()['models'], model)
+        except Exception as e:
+            print(f"Error looking up model digest: {e}")
+            return None
+        return entry.get('digest') if entry else None
+
+    def warm(self, model):
+        # An empty prompt loads the model without generating anything
+        response = self.client.generate(model=model, prompt='', keep_alive=self.config['LLM_KEEP_ALIVE'])
+        return (response.get('load_duration') or 0) / 1e9
+
+    def resident_model(self, model):
+        entry = find_ollama_model(self.client.ps()['models'], model)
+        return {'expires_at': str(entry.get('expires_at'))} if entry else None
+
+
+"""
+# Name: OpenAICompatibleBackend - OpenAI-Compatible HTTP LLM Backend
+# Desc: Talks to a local server exposing the OpenAI chat completions API (llama.cpp server, vLLM, LM Studio, ...) at LLM_BASE_URL.
+#       These servers don't report model digests, so the response cache is off with this backend
+# Precondition: The server is running and serves LLM_MODEL
+# Postcondition: Implements LLMBackend - token counts come from the stream's usage report, load times are not available
+"""
+class OpenAICompatibleBackend(LLMBackend):
+    def __init__(self, config):
+        super().__init__(config)
+        self.base_url = (config['LLM_BASE_URL'] or 'http://localhost:8000/v1').rstrip('/')
+        self.headers = {'Authorization': f"Bearer {config['LLM_API_KEY']}"} if config['LLM_API_KEY'] else {}
+        # Created on first use, on the scheduler's event loop
+        self.async_client = None
+
+    async def stream_chat(self, model, messages, schema=None, options=None):
+        if self.async_client is None:
+            self.async_client = httpx.AsyncClient(headers=self.headers, timeout=None)
+
+        body = {'model': model, 'messages': messages, 'stream': True, 'stream_options': {'include_usage': True}}
+        if options and options.get('num_predict'):
+            body['max_tokens'] = options['num_predict']
+        if schema:
+            body['response_format'] = {'type': 'json_schema', 'json_schema': {'name': 'events', 'schema': schema}}
+
+        usage = {}
+        async with self.async_client.stream('POST', f'{self.base_url}/chat/completions', json=body) as response:
+            response.raise_for_status()
+            # Server-sent events - one "data: {json}" line per piece, ending with "data: [DONE]"
+            async for line in response.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                payload = json.loads(data)
+                usage = payload.get('usage') or usage
+                for choice in payload.get('choices') or []:
+                    content = (choice.get('delta') or {}).get('content')
+                    if content:
+                        yield {'content': content, 'done': False}
+
+        yield {'content': '', 'done': True, 'load_duration': 0, 'prompt_eval_count': usage.get('prompt_tokens', 0),
+               'prompt_eval_duration': 0, 'eval_count': usage.get('completion_tokens', 0)}
+
+    def warm(self, model):
+        # Asks for a single token, which makes servers that load models on demand load this one
+        start = time.perf_counter()
+        response = httpx.post(f'{self.base_url}/chat/completions', headers=self.headers, timeout=None,
+                              json={'model': model, 'messages': [{'role': 'user', 'content': 'hi'}], 'max_tokens': 1})
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    def resident_model(self, model):
+        response = httpx.get(f'{self.base_url}/models', headers=self.headers, timeout=10)
+        response.raise_for_status()
+        served = {entry.get('id') for entry in response.json().get('data', [])}
+        return {} if model in served else None
+
+
+# Reply the stub backend gives when LLM_STUB_RESPONSES isn't set
+STUB_DEFAULT_RESPONSE = '[{"event": "Stub Assignment", "date": "September 15"}]'
+
+
+"""
+# Name: StubBackend - Deterministic Stub LLM Backend
+# Desc: Replays canned replies without any model, for benchmarks and load tests on machines with no model server. The same
+#       prompt always gets the same reply, streamed after LLM_STUB_LATENCY seconds at LLM_STUB_CHARS_PER_SECOND
+# Precondition: LLM_STUB_RESPONSES is empty or a JSON file holding a list of replies (strings, or JSON values to send as text)
+# Postcondition: Implements LLMBackend with an estimated reply token count, no prompt token count (0, as it has no tokenizer)
+#                and a digest derived from the canned replies
+"""
+class StubBackend(LLMBackend):
+    def __init__(self, config):
+        super().__init__(config)
+        self.responses = [STUB_DEFAULT_RESPONSE]
+        if config['LLM_STUB_RESPONSES']:
+            with open(config['LLM_STUB_RESPONSES'], 'r', encoding='utf-8') as f:
+                self.responses = [reply if isinstance(reply, str) else json.dumps(reply) for reply in json.load(f)] or self.responses
+        # Changing the canned replies changes the digest, so the response cache never serves replies from an older set
+        self.digest = 'stub-' + hashlib.sha256(json.dumps(self.responses).encode('utf-8')).hexdigest()[:12]
+
+    async def stream_chat(self, model, messages, schema=None, options=None):
+        prompt = ''.join(message['content'] for message in messages)
+        reply = self.responses[int(hashlib.sha256(prompt.encode('utf-8')).hexdigest(), 16) % len(self.responses)]
+
+        await asyncio.sleep(self.config['LLM_STUB_LATENCY'])
+        piece = 16
+        for start in range(0, len(reply), piece):
+            if self.config['LLM_STUB_CHARS_PER_SECOND']:
+                await asyncio.sleep(piece / self.config['LLM_STUB_CHARS_PER_SECOND'])
+            yield {'content': reply[start:start + piece], 'done': False}
+
+        yield {'content': '', 'done': True, 'load_duration': 0, 'prompt_eval_count': 0,
+               'prompt_eval_duration': 0, 'eval_count': estimate_tokens(reply)}
+
+    def model_digest(self, model):
+        return self.digest
+
+
+# LLM backends selectable with the LLM_BACKEND setting
+LLM_BACKENDS = {
+    'ollama': OllamaBackend,
+    'openai': OpenAICompatibleBackend,
+    'stub': StubBackend,
+}
+
+
+"""
+# Name: get_llm_backend - LLM Backend Accessor
+# Desc: Lazily creates the backend named by the LLM_BACKEND setting
+# Precondition: LLM_BACKEND is a key of LLM_BACKENDS
+# Postcondition: Returns the process-wide backend, creating it on the first call
+"""
+def get_llm_backend():
+    global _llm_backend
+
+    with _llm_backend_lock:
+        if _llm_backend is None:
+            _llm_backend = LLM_BACKENDS[app.config['LLM_BACKEND']](app.config)
+    return _llm_backend
+
+
+"""
+# Name: open_llm_cache - LLM Cache Connection
+# Desc: Opens a connection to the SQLite response cache, creating the table on first use. WAL mode lets
+#       several gunicorn workers read while one writes, and the timeout makes writers wait instead of failing
+# Precondition: LLM_CACHE_PATH's folder is writable
+# Postcondition: Returns a new sqlite3 connection (each caller closes its own - connections aren't shared across threads)
+"""
+def open_llm_cache():
+    path = app.config['LLM_CACHE_PATH']
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS llm_responses (
+            model TEXT NOT NULL,
+            model_digest TEXT NOT NULL,
+            prompt_version INTEGER NOT NULL,
+            chunk_hash TEXT NOT NULL,
+            response TEXT NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (model, model_digest, prompt_version, chunk_hash)
+        )
+    """)
+    connection.execute('CREATE INDEX IF NOT EXISTS llm_responses_last_used ON llm_responses (last_used)')
+    return connection
+
+
+"""
+# Name: load_cached_response - LLM Cache Lookup
+# Desc: Looks up a previous reply for this chunk and marks it as recently used, counting the hit or miss
+# Precondition: key is a (model, model digest, prompt version, hash of output format and chunk) tuple
+# Postcondition: Returns the cached reply text, or None on a miss
+"""
+def load_cached_response(key):
+    try:
+        with closing(open_llm_cache()) as connection, connection:
+            row = connection.execute(
+                'SELECT response FROM llm_responses WHERE model = ? AND model_digest = ? AND prompt_version = ? AND chunk_hash = ?',
+                key).fetchone()
+            if row:
+                connection.execute(
+                    'UPDATE llm_responses SET last_used = ? WHERE model = ? AND model_digest = ? AND prompt_version = ? AND chunk_hash = ?',
+                    (time.time(), *key))
+    except sqlite3.Error as e:
+        print(f"Error reading LLM cache: {e}")
+        row = None
+
+    record_stat('llm_cache_hits' if row else 'llm_cache_misses')
+    return row[0] if row else None
+
+
+"""
+# Name: store_cached_response - LLM Cache Writer
+# Desc: Saves a reply for this chunk, then trims the cache back to LLM_CACHE_MAX_ENTRIES by dropping the least recently used replies
+# Precondition: key is a (model, model digest, prompt version, hash of output format and chunk) tuple, response_text parsed successfully
+# Postcondition: Reply is stored (replacing any older copy under the same key)
+"""
+def store_cached_response(key, response_text):
+    try:
+        with closing(open_llm_cache()) as connection, connection:
+            connection.execute('INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?, ?, ?, ?)', (*key, response_text, time.time()))
+            connection.execute(
+                'DELETE FROM llm_responses WHERE rowid IN (SELECT rowid FROM llm_responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                (app.config['LLM_CACHE_MAX_ENTRIES'],))
+    except sqlite3.Error as e:
+        print(f"Error writing LLM cache: {e}")
+
+
+"""
+# Name: IncrementalEventParser - Streaming JSON Event Parser
+# Desc: Reads the model's reply as it streams in and hands back each {"event", "date"} object as soon as its closing brace
+#       arrives. Text outside the objects (and the array brackets) is skipped, and a malformed object only loses itself
+# Precondition: Fed the reply text in order, in pieces of any size
+# Postcondition: feed() returns the events completed by that piece, complete is True once a whole well-formed array was seen
+"""
+class IncrementalEventParser:
+    def __init__(self):
+        self.buffer = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.array_opened = False
+        self.array_closed = False
+        self.malformed = 0
+
+    def feed(self, text):
+        events = []
+
+        for char in text:
+            # Between objects, only the array brackets matter
+            if self.depth == 0:
+                if char == '{':
+                    self.depth = 1
+                    self.buffer = [char]
+                elif char == '[':
+                    self.array_opened = True
+                elif char == ']' and self.array_opened:
+                    self.array_closed = True
+                continue
+
+            self.buffer.append(char)
+            # Braces inside strings (e.g., an event named "Lab {3}") don't count
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == '{':
+                self.depth += 1
+            elif char == '}':
+                self.depth -= 1
+                if self.depth == 0:
+                    event = self.finish_object(''.join(self.buffer))
+                    if event:
+                        events.append(event)
+
+        return events
+
+    def finish_object(self, object_text):
+        try:
+            event = json.loads(object_text)
+        except json.JSONDecodeError:
+            event = None
+
+        if not isinstance(event, dict) or 'event' not in event or 'date' not in event:
+            print(f"Skipping malformed event: {object_text[:200]}")
+            self.malformed += 1
+            return None
+        return event
+
+    @property
+    def complete(self):
+        return self.array_opened and self.array_closed and self.depth == 0 and not self.malformed
+
+
+"""
+# Name: LLMScheduler - Cross-Request LLM Work Queue
+# Desc: Runs every upload's model requests on one dedicated event loop thread, at most `slots` at a time. Waiting jobs are taken
+#       strictly by priority ('interactive' before 'bulk'), and round-robin between users within a priority, so one large
+#       upload can't hold every slot while another user waits
+# Precondition: slots is this process's share of the requests the Ollama server runs in parallel
+# Postcondition: submit() returns a concurrent.futures.Future for the job's result. Queue depth, running jobs and wait times are
+#                available through snapshot() and /metrics
+"""
+class LLMScheduler:
+    PRIORITIES = ('interactive', 'bulk')
+
+    def __init__(self, slots):
+        self.slots = slots
+        # Per priority, an ordered map of user -> their waiting jobs (the user at the front is served next)
+        self.queues = {priority: OrderedDict() for priority in self.PRIORITIES}
+        self.running = {}
+        self.depth = 0
+        self.loop = None
+        self.ready = threading.Event()
+        threading.Thread(target=self.run, name='llm-scheduler', daemon=True).start()
+        self.ready.wait()
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        # Counts waiting jobs, each worker takes one permit per job it picks up
+        self.available = asyncio.Semaphore(0)
+        for _ in range(self.slots):
+            self.loop.create_task(self.worker())
+        self.ready.set()
+        self.loop.run_forever()
+
+    def submit(self, job_factory, priority='interactive', user=None):
+        # job_factory is called on the scheduler thread and must return a coroutine
+        job = {'factory': job_factory, 'future': Future(), 'priority': priority, 'user': user, 'submitted': time.perf_counter()}
+        self.loop.call_soon_threadsafe(self.enqueue, job)
+        return job['future']
+
+    def cancel(self, future):
+        # Jobs still waiting are cancelled directly, running ones have their task cancelled on the scheduler thread
+        if not future.cancel():
+            self.loop.call_soon_threadsafe(self.cancel_running, future)
+
+    def enqueue(self, job):
+        queue = self.queues[job['priority']]
+        queue.setdefault(job['user'], deque()).append(job)
+        self.depth += 1
+        self.available.release()
+
+    def cancel_running(self, future):
+        task = self.running.get(future)
+        if task:
+            task.cancel()
+
+    def next_job(self):
+        for priority in self.PRIORITIES:
+            queue = self.queues[priority]
+            if queue:
+                user, jobs = next(iter(queue.items()))
+                job = jobs.popleft()
+                # Sends this user to the back of the line, or drops them once they have nothing waiting
+                if jobs:
+                    queue.move_to_end(user)
+                else:
+                    del queue[user]
+                self.depth -= 1
+                return job
+        return None
+
+    async def worker(self):
+        while True:
+            await self.available.acquire()
+            job = self.next_job()
+            future = job['future']
+            # Skips jobs cancelled while they were waiting
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            record_stat('llm_queue_jobs')
+            record_stat('llm_queue_wait_seconds', time.perf_counter() - job['submitted'])
+
+            task = self.loop.create_task(job['factory']())
+            self.running[future] = task
+            try:
+                future.set_result(await task)
+            except asyncio.CancelledError:
+                future.set_exception(CancelledError())
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                del self.running[future]
+
+    def snapshot(self):
+        return {'llm_queue_depth': self.depth, 'llm_running': len(self.running), 'llm_slots': self.slots}
+
+
+"""
+# Name: get_llm_scheduler - LLM Scheduler Accessor
+# Desc: Lazily starts this process's LLMScheduler with its share of the LLM_MAX_IN_FLIGHT slots
+# Precondition: None
+# Postcondition: Returns the process-wide scheduler, starting it on the first call
+"""
+def get_llm_scheduler():
+    global _llm_scheduler
+
+    with _llm_scheduler_lock:
+        if _llm_scheduler is None:
+            _llm_scheduler = LLMScheduler(scheduler_slots())
+    return _llm_scheduler
+
+
+"""
+# Name: scheduler_slots - Per-Process Model Slots
+# Desc: Splits the model server's LLM_MAX_IN_FLIGHT slots evenly between the LLM_SERVER_PROCESSES server processes, so the
+#       processes together never send the server more requests than it runs at once
+# Precondition: LLM_MAX_IN_FLIGHT and LLM_SERVER_PROCESSES are at least 1
+# Postcondition: Returns this process's slot count (at least 1, so every process can make progress)
+"""
+def scheduler_slots():
+    return max(1, app.config['LLM_MAX_IN_FLIGHT'] // max(1, app.config['LLM_SERVER_PROCESSES']))
+
+
+"""
+# Name: generate_chunk_events - Streaming Model Call
+# Desc: Runs on the scheduler thread - sends one prompt's messages to the model on the LLM backend and reads the reply as it is generated, passing each event
+#       to on_event and appending it to events as soon as it is parsed, so a failure or cancellation part way through keeps what arrived
+# Precondition: parser is a fresh IncrementalEventParser, result is the chunk's result dict, submitted is the perf_counter time the
+#               job was queued
+# Postcondition: Fills in result's 'queue_wait', 'elapsed', 'parsed', 'load_seconds', 'prompt_tokens', 'prompt_eval_seconds' and
+#                'eval_tokens' keys
+#                ('error' too if the call failed), returns the full reply text ('' if the call failed)
+"""
+async def generate_chunk_events(model, messages, parser, events, on_event, result, submitted):
+    start = time.perf_counter()
+    result['queue_wait'] = start - submitted
+    response_parts = []
+
+    try:
+        # Sends the request to the model server and reads the reply as it is generated
+        stream = get_llm_backend().stream_chat(model, messages,
+                                               schema=EVENTS_SCHEMA if app.config['LLM_SCHEMA_OUTPUT'] else None,
+                                               options={'num_ctx': app.config['LLM_NUM_CTX'], 'num_predict': app.config['LLM_OUTPUT_TOKENS']})
+        async for part in stream:
+            response_parts.append(part['content'])
+            for event in parser.feed(part['content']):
+                events.append(event)
+                on_event(event)
+            # The last streamed part carries the timings for the whole call
+            if part['done']:
+                result['load_seconds'] = part['load_duration'] / 1e9
+                result['prompt_tokens'] = part['prompt_eval_count']
+                result['prompt_eval_seconds'] = part['prompt_eval_duration'] / 1e9
+                result['eval_tokens'] = part['eval_count']
+    except Exception as e:
+        print(f"Error extracting events: {e}")
+        result['error'] = str(e) or type(e).__name__
+        result['elapsed'] = time.perf_counter() - start
+        return ''
+
+    result['elapsed'] = time.perf_counter() - start
+    result['parsed'] = parser.complete
+    return ''.join(response_parts)
+
+
+"""
+# Name: extract_chunk_events_async - Single Chunk Event Extractor
+# Desc: Extracts important dates and events from one chunk of syllabus text, reusing a cached reply when there is one and otherwise
+#       queueing the model call on the shared scheduler. A failed call, empty reply or unparseable reply is retried up to
+#       LLM_CHUNK_RETRIES times with exponential backoff. Each attempt collects its own events (passed to on_event as they are
+#       parsed), so a successful retry replaces what failed attempts found, and when every attempt fails the leading objects of the
+#       truncated or invalid replies are kept, without duplicates
+# Precondition: chunk fits in the model's context, model is the model to run it on, model_digest is that model's digest (None
+#               disables the cache), events is the list to collect this chunk's events in, priority/user are passed to the scheduler
+# Postcondition: events holds the successful attempt's events, or the distinct events salvaged from the failed attempts. Returns a dict with 'elapsed' (seconds spent on the last request), 'queue_wait', 'cache_hit', 'parsed' (whether the
+#                reply parsed cleanly), 'load_seconds' (time the server spent loading the model), 'prompt_tokens',
+#                'prompt_eval_seconds', 'eval_tokens', 'attempts' and 'error' (why the last attempt failed, None if it succeeded) keys. Counts parse failures, retries and
+#                cold/warm calls for /metrics
+"""
+async def extract_chunk_events_async(chunk, model, model_digest, events, on_event, priority, user):
+    schema_output = app.config['LLM_SCHEMA_OUTPUT']
+    layout = app.config['LLM_PROMPT_LAYOUT']
+    parser = IncrementalEventParser()
+    result = {'elapsed': 0.0, 'queue_wait': 0.0, 'cache_hit': False, 'parsed': False, 'load_seconds': 0.0,
+              'prompt_tokens': 0, 'prompt_eval_seconds': 0.0, 'eval_tokens': 0, 'attempts': 0, 'error': None}
+
+    key = None
+    if model_digest:
+        # The chunk is hashed together with the requested output format, so schema-constrained and free-form replies are cached
+        # apart and the parse failure comparison between the two modes stays honest
+        output_format = json.dumps(EVENTS_SCHEMA, sort_keys=True) if schema_output else 'freeform'
+        key = (model, model_digest, PROMPT_VERSIONS[layout], hashlib.sha256(f'{output_format}\0{chunk}'.encode('utf-8')).hexdigest())
+        # Cache lookups happen here rather than on the scheduler so hits never wait in the queue
+        cached = load_cached_response(key)
+        if cached is not None:
+            for event in parser.feed(cached):
+                events.append(event)
+                on_event(event)
+            result.update(cache_hit=True, parsed=True)
+            return result
+
+    messages = build_prompt_messages(chunk, layout)
+    scheduler = get_llm_scheduler()
+    # Events from each failed attempt, kept in case every attempt fails
+    failed_attempts = []
+    for attempt in range(app.config['LLM_CHUNK_RETRIES'] + 1):
+        if attempt:
+            # Backs off before retrying, doubling the wait each time
+            record_stat('llm_retries')
+            try:
+                await asyncio.sleep(app.config['LLM_RETRY_BACKOFF'] * 2 ** (attempt - 1))
+            except asyncio.CancelledError:
+                events[:] = salvage_events(failed_attempts)
+                raise
+            parser = IncrementalEventParser()
+        result.update(attempts=attempt + 1, error=None, parsed=False)
+        attempt_events = []
+
+        submitted = time.perf_counter()
+        future = scheduler.submit(lambda parser=parser, attempt_events=attempt_events:
+                                  generate_chunk_events(model, messages, parser, attempt_events, on_event, result, submitted),
+                                  priority, user)
+        try:
+            response_text = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Stops the model call too if this chunk is cancelled (e.g., the extraction timed out), keeping what arrived so far
+            scheduler.cancel(future)
+            events[:] = salvage_events(failed_attempts + [attempt_events])
+            raise
+
+        if response_text:
+            record_reply_stats(messages, parser, result, schema_output, layout)
+            if parser.complete:
+                # Only replies that parsed cleanly are cached, so a bad generation gets retried next time
+                if key:
+                    store_cached_response(key, response_text)
+                events[:] = attempt_events
+                break
+            result['error'] = 'reply was not valid JSON'
+        elif not result['error']:
+            # The call finished without an error but the model said nothing
+            result['error'] = 'empty reply'
+        failed_attempts.append(attempt_events)
+
+    if result['error']:
+        record_stat('llm_failed_chunks')
+        events[:] = salvage_events(failed_attempts)
+    return result
+
+
+"""
+# Name: salvage_events - Failed Attempt Merger
+# Desc: Merges the events parsed from a chunk's failed attempts, starting from the attempt that got furthest, so an event that
+#       several attempts produced is only kept once
+# Precondition: attempts is a list of event lists, one per attempt
+# Postcondition: Returns the distinct events, in the order the best attempt produced them followed by any the others added
+"""
+def salvage_events(attempts):
+    return dedupe_events([event for attempt_events in sorted(attempts, key=len, reverse=True) for event in attempt_events])
+
+
+"""
+# Name: record_reply_stats - Model Reply Accounting
+# Desc: Logs and records the token counts, cold/warm latency and parse outcome of one model reply
+# Precondition: messages were sent to the model in the given prompt layout, parser has been fed the whole reply, result is the chunk's
+#               result dict for this call
+# Postcondition: Counters in STATS are updated for /metrics
+"""
+def record_reply_stats(messages, parser, result, schema_output, layout):
+    # Logs what the call actually used against the estimate. The estimator isn't recalibrated from it - with the system layout
+    # the server leaves the cached prefix out of prompt_eval_count, and chunk boundaries have to stay put between uploads
+    prompt = ''.join(message['content'] for message in messages)
+    print(f"LLM call: {result['prompt_tokens']} prompt tokens (estimated {estimate_tokens(prompt)}), "
+          f"{result['eval_tokens']} output tokens, {result['prompt_eval_seconds']:.2f}s prompt eval")
+    record_stat('llm_prompt_tokens', result['prompt_tokens'])
+    record_stat('llm_eval_tokens', result['eval_tokens'])
+
+    # Prompt evaluation time per layout, to compare how much of the prompt each one lets the server reuse
+    record_stat(f'llm_prompt_eval_calls_{layout}')
+    record_stat(f'llm_prompt_eval_seconds_{layout}', result['prompt_eval_seconds'])
+
+    # Splits call latency by whether the model had to be loaded first
+    kind = 'cold' if result['load_seconds'] >= app.config['LLM_COLD_START_SECONDS'] else 'warm'
+    record_stat(f'llm_{kind}_calls')
+    record_stat(f'llm_{kind}_seconds', result['elapsed'])
+
+    # Tracks parse failures separately for constrained and free-form output so the two can be compared
+    mode = 'schema' if schema_output else 'freeform'
+    record_stat(f'llm_replies_{mode}')
+    if not parser.complete:
+        record_stat(f'llm_parse_failures_{mode}')
+
+
+"""
+# Name: score_chunk_events - Chunk Output Scorer
+# Desc: Scores how much a chunk's model output can be trusted - whether the reply parsed, how many of its dates the calendar step can
+#       read, and how many of the calendar dates mentioned in the chunk ended up as an event. Used to decide which chunks to escalate
+# Precondition: chunk is the text sent to the model, events are the events extracted from it, parsed is whether the reply parsed cleanly
+# Postcondition: Returns a score between 0 (unusable) and 1 (clean reply, every date readable, every mentioned date covered)
+"""
+def score_chunk_events(chunk, events, parsed):
+    year = datetime.now().year
+
+    # Month-day of every event date the calendar step will be able to parse
+    event_days = set()
+    for event in events:
+        try:
+            event_days.add(date_parser.parse(f"{event.get('date', '')} {year}").strftime('%m-%d'))
+        except (ValueError, OverflowError):
+            continue
+    parseable = len(event_days) / len({event_key(event) for event in events}) if events else 1.0
+
+    # Month-day of every calendar date the chunk mentions
+    mentioned_days = set()
+    for match in CALENDAR_DATE_PATTERN.finditer(chunk):
+        try:
+            mentioned_days.add(date_parser.parse(f"{match.group()} {year}", fuzzy=True).strftime('%m-%d'))
+        except (ValueError, OverflowError):
+            continue
+    coverage = len(mentioned_days & event_days) / len(mentioned_days) if mentioned_days else 1.0
+
+    # A truncated reply still counts for half when the parser salvaged events from it
+    validity = 1.0 if parsed else 0.5 if events else 0.0
+    return (validity + min(parseable, 1.0) + coverage) / 3
+
+
+"""
+# Name: run_chunk_pass - Concurrent Chunk Pass
+# Desc: Queues the given chunks on the shared scheduler at once with one model, which runs them alongside other uploads' chunks
+#       (up to this process's share of LLM_MAX_IN_FLIGHT in total), and waits for them until the deadline
+# Precondition: indices are positions in chunks, chunk_events maps each of those positions to the list to collect its events in,
+#               deadline is a perf_counter time, the other arguments are passed to extract_chunk_events_async
+# Postcondition: Returns ({index: task}, model digest). Tasks still running at the deadline are cancelled and have finished cancelling
+"""
+async def run_chunk_pass(chunks, indices, model, chunk_events, emit, priority, user, deadline):
+    model_digest = None
+    if indices and app.config['LLM_CACHE_ENABLED']:
+        # Looked up off the event loop since the backends use blocking clients for it
+        model_digest = await asyncio.to_thread(get_llm_backend().model_digest, model)
+    tasks = {index: asyncio.create_task(extract_chunk_events_async(chunks[index], model, model_digest, chunk_events[index], emit, priority, user))
+             for index in indices}
+    pending = set()
+    if tasks:
+        _, pending = await asyncio.wait(tasks.values(), timeout=max(deadline - time.perf_counter(), 0))
+
+    # Cancels whatever is still running and waits for the cancellations to finish so no request outlives this call
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    if pending:
+        print(f"LLM extraction timed out, cancelled {len(pending)} of {len(tasks)} {model} chunks")
+    return tasks, model_digest
+
+
+"""
+# Name: extract_events_with_ollama_async - Concurrent AI-Powered Event Extractor
+# Desc: Splits the whole syllabus into overlapping chunks and runs them all at once on LLM_MODEL. With LLM_ESCALATION_MODEL set,
+#       chunks whose output scores below LLM_ESCALATION_MIN_SCORE are then re-run on that larger model, and its output replaces the
+#       small model's when it scores at least as well
+# Precondition: text is a string containing extracted PDF content, the model server is running, metrics is an optional dict for timings,
+#               on_event is an optional callable that gets each new (not yet seen) event as soon as it is generated (it is called
+#               from the scheduler thread), priority is 'interactive' or 'bulk', user identifies the submitter for fair scheduling,
+#               failed_sections is an optional list to collect descriptions of the sections that couldn't be fully extracted
+# Postcondition: Returns a de-duplicated list of events in chunk order. A chunk that fails (after its retries), errors or is still
+#                running after LLM_TIMEOUT only loses its own unparsed events - everything else is returned. Adds chunk counts,
+#                timings, cascade savings and failed sections to metrics
+"""
+async def extract_events_with_ollama_async(text, metrics=None, on_event=None, priority='interactive', user=None, failed_sections=None):
+    chunks = pack_chunks(text, prompt_token_budget(), app.config['LLM_CHUNK_OVERLAP_TOKENS'])
+    chunk_events = [[] for _ in chunks]
+
+    # Passes each event on the first time it is seen, overlapping chunks often repeat one
+    seen = set()
+    first_event_at = []
+    def emit(event):
+        key = event_key(event)
+        if key in seen:
+            return
+        seen.add(key)
+        if not first_event_at:
+            first_event_at.append(time.perf_counter())
+        if on_event:
+            on_event(event)
+
+    start = time.perf_counter()
+    deadline = start + app.config['LLM_TIMEOUT']
+    tasks, model_digest = await run_chunk_pass(chunks, range(len(chunks)), app.config['LLM_MODEL'], chunk_events, emit,
+                                               priority, user, deadline)
+
+    # Model cascade - only the chunks the small model handled poorly are re-run on the larger model
+    escalation_model = app.config['LLM_ESCALATION_MODEL']
+    # The first pass's results are kept for the cascade report, since escalated chunks whose output is kept replace their task
+    small_results = {index: task.result() for index, task in tasks.items() if not task.cancelled() and task.exception() is None}
+    escalated = {}
+    if escalation_model:
+        scores = {}
+        for index, task in tasks.items():
+            # Chunks that timed out are left alone, there is no time left to re-run them
+            if task.cancelled():
+                continue
+            parsed = task.exception() is None and task.result()['parsed']
+            scores[index] = score_chunk_events(chunks[index], chunk_events[index], parsed)
+        low = [index for index, score in scores.items() if score < app.config['LLM_ESCALATION_MIN_SCORE']]
+        escalation_events = {index: [] for index in low}
+        escalation_tasks, _ = await run_chunk_pass(chunks, low, escalation_model, escalation_events, emit, priority, user, deadline)
+
+        for index, task in escalation_tasks.items():
+            if task.cancelled() or task.exception() is not None:
+                escalated[index] = (task, False)
+                continue
+            result = task.result()
+            record_stat('llm_escalations')
+            record_stat('llm_escalation_calls', 0 if result['cache_hit'] else 1)
+            record_stat('llm_escalation_seconds', result['elapsed'])
+            # Keeps the larger model's output unless it scores worse than the small model's
+            keep = score_chunk_events(chunks[index], escalation_events[index], result['parsed']) >= scores[index]
+            if keep:
+                chunk_events[index] = escalation_events[index]
+                tasks[index] = task
+            escalated[index] = (task, keep)
+
+    # Collects results in chunk order, regardless of which request finished first
+    timings = []
+    cache_hits = 0
+    parse_failures = 0
+    retries = 0
+    load_seconds = 0.0
+    queue_wait = 0.0
+    token_counts = []
+    prompt_eval_seconds = []
+    failures = []
+    for index in range(len(chunks)):
+        task = tasks[index]
+        # Names the failed section by its position and opening words so the user can find it in the syllabus
+        preview = ' '.join(chunks[index].split())[:60]
+        section = f'section {index + 1} of {len(chunks)} ("{preview}...")'
+        if task.cancelled():
+            timings.append('cancelled')
+            failures.append(f'{section}: timed out, {len(chunk_events[index])} events kept')
+            continue
+        if task.exception() is not None:
+            timings.append('error')
+            failures.append(f'{section}: {task.exception()}, {len(chunk_events[index])} events kept')
+            continue
+        result = task.result()
+        retries += max(result['attempts'] - 1, 0)
+        if result['error']:
+            failures.append(f"{section}: {result['error']} after {result['attempts']} attempts, {len(chunk_events[index])} distinct events salvaged")
+        timings.append('cached' if result['cache_hit'] else f"{result['elapsed']:.1f}s")
+        if index in escalated:
+            timings[-1] += ' (escalated)' if escalated[index][1] else ' (escalation not kept)'
+        if not result['cache_hit']:
+            token_counts.append(f"{result['prompt_tokens']}/{result['eval_tokens']}")
+            prompt_eval_seconds.append(result['prompt_eval_seconds'])
+        cache_hits += result['cache_hit']
+        parse_failures += not result['parsed']
+        load_seconds = max(load_seconds, result['load_seconds'])
+        queue_wait = max(queue_wait, result['queue_wait'])
+
+    if metrics is not None:
+        metrics['LLM chunks'] = f"{len(chunks)} (~{sum(estimate_tokens(chunk) for chunk in chunks)} tokens including overlap, budget {prompt_token_budget()} per prompt)"
+        metrics['LLM time per chunk'] = ', '.join(timings) or 'none'
+        metrics['LLM prompt/output tokens per call'] = ', '.join(token_counts) or 'none'
+        if prompt_eval_seconds:
+            metrics['LLM prompt eval time'] = (f"{sum(prompt_eval_seconds) / len(prompt_eval_seconds):.2f}s mean per call "
+                                               f"({app.config['LLM_PROMPT_LAYOUT']} prompt layout)")
+        metrics['LLM cache'] = f"{cache_hits} of {len(chunks)} chunks hit" if model_digest else 'off (disabled or no model digest)'
+        metrics['LLM replies not fully parsed'] = f"{parse_failures} of {len(chunks)} ({'schema' if app.config['LLM_SCHEMA_OUTPUT'] else 'free-form'} output)"
+        metrics['LLM retries'] = retries
+        metrics['LLM failed sections'] = '; '.join(failures) or 'none'
+        if escalation_model:
+            metrics['Model cascade'] = cascade_summary(len(chunks), small_results, escalated, escalation_model)
+        cold = load_seconds >= app.config['LLM_COLD_START_SECONDS']
+        metrics['Model load'] = f"cold start ({load_seconds:.1f}s loading)" if cold else 'warm'
+        metrics['LLM time to first event'] = f"{first_event_at[0] - start:.1f}s" if first_event_at else 'no events'
+        metrics['LLM queue wait'] = f"{queue_wait:.1f}s longest ({priority} priority)"
+        metrics['LLM wall time'] = f"{time.perf_counter() - start:.1f}s sharing {scheduler_slots()} model slots"
+
+    if failed_sections is not None:
+        failed_sections.extend(failures)
+    return dedupe_events([event for events in chunk_events for event in events])
+
+
+"""
+# Name: cascade_summary - Model Cascade Report
+# Desc: Describes how many chunks were escalated and estimates the model time the cascade saved, compared with running every chunk on
+#       the larger model. The larger model's time per chunk is the running mean of its calls in /metrics. Only chunks whose every
+#       model call ran to completion are compared - cache hits cost no model time on either side, and a timed-out call has no timing
+# Precondition: small_results maps the first pass's finished chunk positions to their results, escalated maps escalated chunk
+#               positions to (task, kept)
+# Postcondition: Returns a one-line summary for the results page, and adds the saving (negative when the cascade cost time) to
+#                /metrics
+"""
+def cascade_summary(chunk_count, small_results, escalated, escalation_model):
+    kept = sum(1 for _, keep in escalated.values() if keep)
+    summary = f"{len(escalated)} of {chunk_count} chunks escalated to {escalation_model} ({kept} kept its output)"
+
+    # Adds up the model time spent on each chunk that actually ran the model, first pass and escalation alike
+    timed = 0
+    spent = 0.0
+    for index, result in small_results.items():
+        if result['cache_hit']:
+            continue
+        seconds = result['elapsed']
+        if index in escalated:
+            task, _ = escalated[index]
+            if task.cancelled() or task.exception() is not None or task.result()['cache_hit']:
+                continue
+            seconds += task.result()['elapsed']
+        timed += 1
+        spent += seconds
+    if not timed:
+        return f"{summary}, no model time to compare (every chunk hit the cache or timed out)"
+
+    with _stats_lock:
+        calls = STATS.get('llm_escalation_calls', 0)
+        large_mean = STATS.get('llm_escalation_seconds', 0) / calls if calls else None
+    if large_mean is None:
+        return f"{summary}, time saved unknown until {escalation_model} has been timed"
+
+    saved = large_mean * timed - spent
+    record_stat('llm_cascade_seconds_saved', saved)
+    comparison = f"{escalation_model} on every uncached chunk ({timed} at {large_mean:.1f}s each)"
+    # A loss too small to show is reported as no saving rather than "~-0.0s"
+    if round(saved, 1) < 0:
+        return f"{summary}, ~{-saved:.1f}s more model time than {comparison}"
+    return f"{summary}, ~{max(saved, 0.0):.1f}s of model time saved vs. {comparison}"
+
+
+"""
+# Name: warm_model - Model Warm-Up
+# Desc: Asks the model server to load the configured model (and, for Ollama, keep it for LLM_KEEP_ALIVE)
+# Precondition: Model server is running
+# Postcondition: Model is resident in the server's memory, the load time is recorded in /metrics. Errors are printed, not raised
+"""
+def warm_model():
+    global _warmup_running
+
+    try:
+        start = time.perf_counter()
+        load_seconds = get_llm_backend().warm(app.config['LLM_MODEL'])
+        record_stat('llm_warmups')
+        record_stat('llm_warmup_load_seconds', load_seconds)
+        print(f"Model {app.config['LLM_MODEL']} warm after {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        print(f"Error warming model: {e}")
+    finally:
+        with _warmup_lock:
+            _warmup_running = False
+
+
+"""
+# Name: start_model_warmup - Background Warm-Up Starter
+# Desc: Runs warm_model on a background thread so loading the model overlaps with whatever the caller does next
+# Precondition: None
+# Postcondition: A warm-up thread is running (a new one is not started while another is still loading)
+"""
+def start_model_warmup():
+    global _warmup_running
+
+    with _warmup_lock:
+        if _warmup_running:
+            return
+        _warmup_running = True
+    threading.Thread(target=warm_model, daemon=True).start()
+
+
+"""
+# Name: extract_events_with_ollama - AI-Powered Event Extractor
+# Desc: Synchronous wrapper around extract_events_with_ollama_async for callers outside an event loop (e.g., Flask request threads)
+# Precondition: text is a string containing extracted PDF content, Ollama service is running, metrics is an optional dict for timings,
+#               on_event is an optional callable that gets each new event while generation is still running,
+#               priority is 'interactive' or 'bulk', user identifies the submitter for fair scheduling
+# Postcondition: Returns a de-duplicated list of dictionaries with 'event' and 'date' keys
+"""
+def extract_events_with_ollama(text, metrics=None, on_event=None, priority='interactive', user=None, failed_sections=None):
+    return asyncio.run(extract_events_with_ollama_async(text, metrics, on_event, priority, user, failed_sections))
+
+
+"""
+# Name: get_calendar_credentials - Google Calendar Credential Cache
+# Desc: Loads the user's credentials from their token file once per process and keeps them in memory, refreshing the access token
+#       only when it is missing, invalid or within CALENDAR_REFRESH_MARGIN seconds of expiring
+# Precondition: credentials.json exists in project root, Google Calendar API is enabled in Google Cloud Console,
+#               metrics is an optional dict for processing details
+# Postcondition: Returns valid credentials shared by every thread, writes token_file whenever they change
+"""
+def get_calendar_credentials(token_file, metrics=None):
+    with _calendar_credentials_lock:
+        creds = _calendar_credentials.get(token_file)
+
+        # Token file stores the user's access and refresh tokens
+        if creds is None and os.path.exists(token_file):
+            creds = Credentials.from_authorized_user_file(token_file, SCOPES)
+
+        # google-auth keeps expiry as a naive UTC datetime
+        margin = timedelta(seconds=app.config['CALENDAR_REFRESH_MARGIN'])
+        near_expiry = creds is not None and creds.expiry is not None and \
+            creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None) < margin
+
+        # If there are no valid credentials (or they are about to expire), refreshes them or lets the user log in
+        if not creds or not creds.valid or near_expiry:
+            if creds and creds.refresh_token:
+                start = time.perf_counter()
+                creds.refresh(Request())
+                seconds = time.perf_counter() - start
+                record_stat('calendar_token_refreshes')
+                record_stat('calendar_refresh_seconds', seconds)
+                if metrics is not None:
+                    metrics['Calendar token refresh'] = f"{seconds:.2f}s"
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
+                creds = flow.run_local_server(port=8080)
+
+            # Saves the credentials for the next run
+            with open(token_file, 'w') as token:
+                token.write(creds.to_json())
+
+        _calendar_credentials[token_file] = creds
+    return creds
+
+
+"""
+# Name: get_calendar_service - Google Calendar API Authentication
+# Desc: Returns an authorized Google Calendar service object for the user, built once per thread (httplib2 connections aren't
+#       thread-safe) from the discovery document bundled with the client library instead of fetching it
+# Precondition: credentials.json exists in project root, Google Calendar API is enabled in Google Cloud Console,
+#               metrics is an optional dict for processing details
+# Postcondition: Returns this thread's cached service for the user (building it on first use, or when the credentials were replaced),
+#                build and refresh times are recorded in /metrics
+"""
+def get_calendar_service(metrics=None):
+    token_file = app.config['CALENDAR_TOKEN_FILE']
+    creds = get_calendar_credentials(token_file, metrics)
+
+    # Each thread keeps its own {token file: (credentials, service)}
+    services = getattr(_calendar_local, 'services', None)
+    if services is None:
+        services = _calendar_local.services = {}
+
+    cached = services.get(token_file)
+    if cached is not None and cached[0] is creds:
+        if metrics is not None:
+            metrics['Calendar service'] = 'reused'
+        return cached[1]
+
+    start = time.perf_counter()
+    service = build('calendar', 'v3', credentials=creds, static_discovery=True, cache_discovery=False)
+    seconds = time.perf_counter() - start
+    record_stat('calendar_service_builds')
+    record_stat('calendar_build_seconds', seconds)
+    if metrics is not None:
+        metrics['Calendar service'] = f"built in {seconds:.2f}s"
+
+    services[token_file] = (creds, service)
+    return service
+
+
+"""
+# Name: calendar_sync_hash - Calendar Sync Key
+# Desc: Stable hash identifying an imported event (or, with only a course, a course) in the calendar's private extended properties -
+#       case and spacing differences don't change it, so re-uploading the same syllabus produces the same hashes
+# Precondition: parts are strings (course name, event name, ISO date)
+# Postcondition: Returns a 32-character hex digest
+"""
+def calendar_sync_hash(*parts):
+    normalized = '\x1f'.join(' '.join(part.lower().split()) for part in parts)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]
+
+
+"""
+# Name: build_event_body - Calendar Event Body Builder
+# Desc: Turns one extracted event into the all-day event body the Calendar API expects, tagged with private extended properties
+#       for the course and the event so later syncs can recognise it
+# Precondition: item is a dict with 'event' and 'date' keys, course names the syllabus the event came from
+# Postcondition: Returns the event body, or None if the date can't be parsed
+"""
+def build_event_body(item, course=''):
+    event_name = item.get('event', 'Untitled Event')
+    date_str = item.get('date', '')
+
+    try:
+        # Parses the date with the current year - dateutil handles format variations
+        event_date = date_parser.parse(f"{date_str} {datetime.now().year}")
+    except Exception as e:
+        print(f"Error parsing date: {date_str}")
+        return None
+
+    return {
+        'summary': event_name,
+        'start': {
+            'date': event_date.strftime('%Y-%m-%d'),
+            'timeZone': 'America/New_York',
+        },
+        'end': {
+            'date': event_date.strftime('%Y-%m-%d'),
+            'timeZone': 'America/New_York',
+        },
+        'description': f'Imported from syllabus',
+        'extendedProperties': {
+            'private': {
+                'syllabusCourse': calendar_sync_hash(course),
+                'syllabusEvent': calendar_sync_hash(course, event_name, event_date.strftime('%Y-%m-%d')),
+            },
+        },
+    }
+
+
+"""
+# Name: fetch_imported_event_hashes - Imported Event Lookup
+# Desc: Finds the events already imported for a course with one events().list query filtered on the course's private extended
+#       property (only following further pages for courses with more events than fit in one)
+# Precondition: service is an authorized Calendar service, course names the syllabus
+# Postcondition: Returns the set of syllabusEvent hashes already in the calendar
+"""
+def fetch_imported_event_hashes(service, course):
+    hashes = set()
+    page_token = None
+    while True:
+        response = service.events().list(calendarId='primary', privateExtendedProperty=f'syllabusCourse={calendar_sync_hash(course)}',
+                                         maxResults=2500, pageToken=page_token,
+                                         fields='items(extendedProperties/private),nextPageToken').execute()
+        for item in response.get('items', []):
+            event_hash = item.get('extendedProperties', {}).get('private', {}).get('syllabusEvent')
+            if event_hash:
+                hashes.add(event_hash)
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return hashes
+
+
+"""
+# Name: prepare_event_bodies - Calendar Insert Planner
+# Desc: Builds the event bodies still to be inserted, leaving out events already in the calendar from an earlier import and events
+#       this upload has already sent
+# Precondition: events is a list of dicts with 'event' and 'date' keys, course names the syllabus (or is its PDF's hash), existing
+#               is the set of event hashes already in the calendar, sent is the set of hashes this upload has sent, counts is a dict
+#               of insert counts
+# Postcondition: Returns the new event bodies, sent includes their hashes and counts['skipped'] the events already imported
+"""
+def prepare_event_bodies(events, course, existing, sent, counts):
+    bodies = []
+    for body in (build_event_body(item, course) for item in events):
+        if body is None:
+            continue
+        event_hash = body['extendedProperties']['private']['syllabusEvent']
+        # Repeats within this upload are dropped silently, only earlier imports count as skipped
+        if event_hash in sent:
+            continue
+        sent.add(event_hash)
+        if event_hash in existing:
+            counts['skipped'] = counts.get('skipped', 0) + 1
+            continue
+        bodies.append(body)
+    return bodies
+
+
+"""
+# Name: insert_event_bodies - Batched Calendar Inserter
+# Desc: Sends the inserts in batch requests of up to CALENDAR_BATCH_SIZE events (one round trip per batch instead of per event).
+#       Inserts that fail inside a batch are retried one at a time with the client's exponential backoff
+# Precondition: service is an authorized Calendar service for this thread, bodies is a list of event bodies, counts is a dict of
+#               insert counts
+# Postcondition: Creates a calendar event for each body it can, adding to counts 'bodies', 'added', 'batches', 'retried' and 'failed'
+"""
+def insert_event_bodies(service, bodies, counts):
+    for key in ('bodies', 'added', 'batches', 'retried', 'failed'):
+        counts.setdefault(key, 0)
+    counts['bodies'] += len(bodies)
+    failed = []
+
+    # Called once per event in a batch, with either the created event or the error for that event alone
+    def on_insert(request_id, response, exception):
+        summary = bodies[int(request_id)]['summary']
+        if exception is not None:
+            print(f"Error creating event {summary}: {exception}")
+            failed.append(int(request_id))
+        else:
+            print(f"Event created: {response.get('htmlLink')}")
+            counts['added'] += 1
+
+    batch_size = min(app.config['CALENDAR_BATCH_SIZE'], 50)
+    for start in range(0, len(bodies), batch_size):
+        batch = service.new_batch_http_request(callback=on_insert)
+        indices = range(start, min(start + batch_size, len(bodies)))
+        for index in indices:
+            batch.add(service.events().insert(calendarId='primary', body=bodies[index]), request_id=str(index))
+        try:
+            batch.execute()
+            counts['batches'] += 1
+        except HttpError as error:
+            # The whole batch request failed, so every event in it gets retried on its own
+            print(f'An error occurred sending a batch of {len(indices)} events: {error}')
+            failed.extend(index for index in indices if index not in failed)
+
+    # Retries the failed inserts individually
+    counts['retried'] += len(failed)
+    for index in failed:
+        try:
+            event = service.events().insert(calendarId='primary', body=bodies[index]).execute(num_retries=app.config['CALENDAR_RETRIES'])
+            print(f"Event created on retry: {event.get('htmlLink')}")
+            counts['added'] += 1
+        except HttpError as error:
+            print(f"Error creating event {bodies[index]['summary']} on retry: {error}")
+            counts['failed'] += 1
+
+
+"""
+# Name: calendar_insert_summary - Calendar Insert Report
+# Desc: Describes an upload's calendar inserts for the results page
+# Precondition: counts is a dict of insert counts from prepare_event_bodies/insert_event_bodies
+# Postcondition: Returns a one-line summary
+"""
+def calendar_insert_summary(counts):
+    summary = (f"{counts.get('added', 0)} of {counts.get('bodies', 0)} added in {counts.get('batches', 0)} batch requests, "
+               f"{counts.get('retried', 0)} retried individually, {counts.get('failed', 0)} failed, "
+               f"{counts.get('skipped', 0)} skipped as already imported")
+    if 'streamed' in counts:
+        summary += f", {counts['streamed']} sent while extraction was still running"
+    return summary
+
+
+"""
+# Name: add_events_to_calendar - Calendar Event Creator
+# Desc: Takes a list of event dictionaries and adds the ones not already imported for this course to the user's Google Calendar
+#       in batch requests
+# Precondition: events is a list of dicts with 'event' and 'date' keys, course names the syllabus (or is its PDF's hash), user is
+#               authenticated with Google Calendar API, metrics is an optional dict for processing details
+# Postcondition: Creates calendar events for each new item in the list, returns (count of successfully added events, count of
+#                events skipped because they were already in the calendar)
+"""
+def add_events_to_calendar(events, metrics=None, course=''):
+    try:
+        service = get_calendar_service(metrics)
+        existing = fetch_imported_event_hashes(service, course)
+    except HttpError as error:
+        print(f'An error occurred: {error}')
+        return 0, 0
+
+    counts = {}
+    insert_event_bodies(service, prepare_event_bodies(events, course, existing, set(), counts), counts)
+    if metrics is not None:
+        metrics['Calendar inserts'] = calendar_insert_summary(counts)
+    return counts.get('added', 0), counts.get('skipped', 0)
+
+
+"""
+# Name: get_calendar_pool - Calendar Thread Pool Accessor
+# Desc: Lazily creates the threads that run CalendarSync streams, one per upload job that can run at once
+# Precondition: None
+# Postcondition: Returns the shared ThreadPoolExecutor with JOB_WORKERS threads
+"""
+def get_calendar_pool():
+    global _calendar_pool
+
+    with _calendar_pool_lock:
+        if _calendar_pool is None:
+            _calendar_pool = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='calendar-sync')
+    return _calendar_pool
+
+
+"""
+# Name: CalendarSync - Streaming Calendar Inserter
+# Desc: Adds an upload's events to the calendar while extraction is still running. Signing in and looking up the course's earlier
+#       imports start at once, events passed to add() are sent in batches as they arrive, and finish() sends whatever the final
+#       event list has that wasn't streamed
+# Precondition: course names the syllabus (or is its PDF's hash), metrics is an optional dict for processing details, the user is
+#               authenticated with Google Calendar API
+# Postcondition: finish() returns (count of successfully added events, count of events skipped because they were already in the calendar),
+#                close() stops the stream without waiting for it
+"""
+class CalendarSync:
+    # Tells the sync thread there are no more events
+    DONE = object()
+
+    def __init__(self, course, metrics=None):
+        self.course = course
+        self.metrics = metrics
+        self.pending = queue.SimpleQueue()
+        self.counts = {'streamed': 0}
+        self.finishing = False
+        self.future = get_calendar_pool().submit(self.run)
+
+    def add(self, event):
+        self.pending.put(event)
+
+    def close(self):
+        self.pending.put(self.DONE)
+
+    def finish(self, events):
+        self.finishing = True
+        for event in events:
+            self.pending.put(event)
+        self.pending.put(self.DONE)
+        if not self.future.result():
+            return 0, 0
+        if self.metrics is not None:
+            self.metrics['Calendar inserts'] = calendar_insert_summary(self.counts)
+        return self.counts.get('added', 0), self.counts.get('skipped', 0)
+
+    def run(self):
+        try:
+            service = get_calendar_service(self.metrics)
+            existing = fetch_imported_event_hashes(service, self.course)
+        except HttpError as error:
+            print(f'An error occurred: {error}')
+            return False
+
+        sent = set()
+        waiting = []
+        first_waiting_at = None
+        done = False
+        while not done:
+            # Waits for the next event, but no longer than the oldest waiting event may wait for its batch
+            timeout = None
+            if first_waiting_at is not None:
+                timeout = max(first_waiting_at + app.config['CALENDAR_STREAM_INTERVAL'] - time.perf_counter(), 0)
+            try:
+                event = self.pending.get(timeout=timeout)
+            except queue.Empty:
+                event = None
+
+            if event is self.DONE:
+                done = True
+            elif event is not None:
+                waiting.append(event)
+                if first_waiting_at is None:
+                    first_waiting_at = time.perf_counter()
+
+            due = event is None or len(waiting) >= app.config['CALENDAR_BATCH_SIZE']
+            if waiting and (done or due):
+                bodies = prepare_event_bodies(waiting, self.course, existing, sent, self.counts)
+                streaming = not self.finishing
+                insert_event_bodies(service, bodies, self.counts)
+                if streaming:
+                    self.counts['streamed'] += len(bodies)
+                waiting = []
+                first_waiting_at = None
+        return True
+
+
+# Loads the model as soon as the app starts (skipped inside extraction pool workers, which import this module too)
+if app.config['LLM_WARM_ON_STARTUP'] and multiprocessing.parent_process() is None:
+    start_model_warmup()
 
-            # Creates the event
-            event_body = {
-                'summary': event_name,
-                'start': {
-                    'date': event_date.strftime('%Y-%m-%d'),
-                    'timeZone': 'America/New_York',
-                },
-                'end': {
-                    'date': event_date.strftime('%Y-%m-%d'),
-                    'timeZone': 'America/New_York',
-                },
-                'description': f'Imported from syllabus'
-            }
 
-            # Adds event to calendar
-            event = service.events().insert(calendarId='primary', body=event_body).execute()
-            print(f"Event created: {event.get('htmlLink')}")
-            added_count += 1
-        
-        return added_count
-    
-    except HttpError as error:
-        print(f'An error occurred: {error}')
-        return 0
-    
-    
 # Only starts the web server if this file is being run directly
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
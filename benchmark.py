@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Benchmarks pick their own backend, so importing the app shouldn't start loading a model
+os.environ.setdefault('FLASK_LLM_WARM_ON_STARTUP', 'false')
+
+from app import (app, EXTRACTION_ENGINES, EVENTS_SCHEMA, LLM_BACKENDS, PROMPT_VERSIONS, STATS, build_prompt_messages,
+                 extract_syllabus_events, get_llm_backend, join_page_text, measure_chars_per_token, pack_chunks,
+                 prompt_token_budget)
+
+"""
+# Name: benchmark_engine - Extraction Engine Benchmark
+# Desc: Runs one extraction engine serially over every PDF in the corpus and times it
+# Precondition: engine is a key of EXTRACTION_ENGINES, paths is a list of readable PDF files
+# Postcondition: Returns (pages extracted, characters extracted, elapsed seconds) for the whole corpus
+"""
+def benchmark_engine(engine, paths):
+    pages = 0
+    chars = 0
+    start = time.perf_counter()
+
+    for path in paths:
+        for page in EXTRACTION_ENGINES[engine](path):
+            pages += 1
+            chars += page['chars']
+
+    return pages, chars, time.perf_counter() - start
+
+
+"""
+# Name: run_upload - Pipeline Load Test Upload
+# Desc: Pushes one PDF through the whole processing pipeline (everything except the calendar), as /upload would
+# Precondition: path is a readable PDF, index is the upload's number (used as its user so the scheduler shares slots between uploads)
+# Postcondition: Returns (seconds the upload took, number of events found)
+"""
+def run_upload(path, index, engine):
+    start = time.perf_counter()
+    _, events = extract_syllabus_events(path, engine, {}, user=f'load-test-{index}')
+    return time.perf_counter() - start, len(events)
+
+
+"""
+# Name: percentile - Latency Percentile
+# Desc: Nearest-rank percentile of a list of timings
+# Precondition: values is a non-empty list of numbers, pct is between 0 and 100
+# Postcondition: Returns the value at the requested percentile
+"""
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+"""
+# Name: load_test_pipeline - Pipeline Load Test
+# Desc: Sends --uploads uploads (cycling through the corpus) through the pipeline from --concurrency threads at once, the same
+#       way concurrent requests to the web app would share the LLM scheduler
+# Precondition: args holds the parsed command line, with the backend already configured
+# Postcondition: Prints throughput, per-upload latency percentiles and the scheduler's queueing stats
+"""
+def load_test_pipeline(args):
+    engine = args.engines[0]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda index: run_upload(args.pdfs[index % len(args.pdfs)], index, engine), range(args.uploads)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [seconds for seconds, _ in results]
+    print(f"backend={app.config['LLM_BACKEND']} uploads={args.uploads} concurrency={args.concurrency} engine={engine}")
+    print(f"throughput: {args.uploads / elapsed:.2f} uploads/sec ({elapsed:.2f}s total)")
+    print(f"latency: p50 {percentile(latencies, 50):.2f}s, p95 {percentile(latencies, 95):.2f}s, max {max(latencies):.2f}s")
+    jobs = STATS.get('llm_queue_jobs', 0)
+    print(f"events: {sum(count for _, count in results)}, LLM calls: {jobs}, "
+          f"queue wait: {STATS.get('llm_queue_wait_seconds', 0) / jobs if jobs else 0:.2f}s mean")
+
+
+"""
+# Name: time_prompt_layouts - Prompt Layout Timing
+# Desc: Sends every chunk to the model once per prompt layout, one call at a time so each call can reuse what the previous one
+#       left in the server's prompt cache, and collects the prompt_eval_duration the server reports for each call
+# Precondition: The configured backend's server is running, chunks is a list of syllabus text chunks
+# Postcondition: Returns {layout: [prompt eval seconds per call]}
+"""
+async def time_prompt_layouts(layouts, chunks):
+    backend = get_llm_backend()
+    durations = {}
+    for layout in layouts:
+        durations[layout] = []
+        for chunk in chunks:
+            stream = backend.stream_chat(app.config['LLM_MODEL'], build_prompt_messages(chunk, layout), schema=EVENTS_SCHEMA,
+                                         options={'num_ctx': app.config['LLM_NUM_CTX'], 'num_predict': app.config['LLM_OUTPUT_TOKENS']})
+            async for part in stream:
+                if part['done']:
+                    durations[layout].append(part['prompt_eval_duration'] / 1e9)
+    return durations
+
+
+"""
+# Name: benchmark_prompt_layouts - Prompt Layout Benchmark
+# Desc: Compares prompt evaluation time per call between the prompt layouts over the same batch of chunks from the corpus
+# Precondition: args holds the parsed command line, the configured backend's server is running
+# Postcondition: Prints the first-call, mean and median prompt eval time for each layout
+"""
+def benchmark_prompt_layouts(args):
+    chunks = []
+    for path in args.pdfs:
+        text = join_page_text(EXTRACTION_ENGINES[args.engines[0]](path))
+        chunks.extend(pack_chunks(text, prompt_token_budget(), app.config['LLM_CHUNK_OVERLAP_TOKENS']))
+    chunks = chunks[:args.chunks]
+
+    durations = asyncio.run(time_prompt_layouts(args.prompt_layouts, chunks))
+    print(f"{len(chunks)} chunks on {app.config['LLM_MODEL']} ({app.config['LLM_BACKEND']} backend), prompt eval seconds per call")
+    print(f"{'layout':<8} {'first':>8} {'mean':>8} {'median':>8}")
+    for layout, seconds in durations.items():
+        if seconds:
+            print(f"{layout:<8} {seconds[0]:>8.3f} {sum(seconds) / len(seconds):>8.3f} {percentile(seconds, 50):>8.3f}")
+
+
+"""
+# Name: calibrate_token_estimate - Token Estimator Calibration Run
+# Desc: Measures the model's characters per token on the corpus, for setting LLM_CHARS_PER_TOKEN
+# Precondition: args holds the parsed command line, the configured backend's server is running
+# Postcondition: Prints the measured ratio
+"""
+def calibrate_token_estimate(args):
+    text = ''.join(join_page_text(EXTRACTION_ENGINES[args.engines[0]](path)) for path in args.pdfs)
+    ratio = measure_chars_per_token(text[:8000])
+    if ratio is not None:
+        print(f"{app.config['LLM_MODEL']}: {ratio} characters per token - set LLM_CHARS_PER_TOKEN (or FLASK_LLM_CHARS_PER_TOKEN) to this")
+
+
+"""
+# Name: main - Benchmark Command Line Entry Point
+# Desc: Benchmarks each requested extraction engine on the same corpus and prints pages/sec, or with --pipeline load-tests the
+#       whole pipeline against an LLM backend (the stub backend needs no model at all), or with --prompt-layouts compares prompt
+#       evaluation time between the prompt layouts, or with --calibrate measures the model's characters per token
+# Precondition: Called with one or more PDF paths on the command line
+# Postcondition: Prints one result line per engine (best of --repeat runs), or the load test's results
+"""
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark PDF text extraction engines')
+    parser.add_argument('pdfs', nargs='+', help='PDF files to extract')
+    parser.add_argument('--engines', nargs='+', default=list(EXTRACTION_ENGINES), choices=list(EXTRACTION_ENGINES))
+    parser.add_argument('--repeat', type=int, default=3, help='runs per engine, the fastest run is reported')
+    parser.add_argument('--pipeline', action='store_true', help='load-test the whole pipeline instead of the extraction engines')
+    parser.add_argument('--backend', default='stub', choices=list(LLM_BACKENDS), help='LLM backend for --pipeline')
+    parser.add_argument('--uploads', type=int, default=20, help='uploads to run with --pipeline')
+    parser.add_argument('--concurrency', type=int, default=4, help='uploads in flight at once with --pipeline')
+    parser.add_argument('--latency', type=float, help='stub backend delay before the first token, in seconds')
+    parser.add_argument('--prompt-layouts', nargs='+', choices=list(PROMPT_VERSIONS),
+                        help='compare prompt eval time per call between these prompt layouts (uses the configured backend)')
+    parser.add_argument('--chunks', type=int, default=20, help='chunks to send per layout with --prompt-layouts')
+    parser.add_argument('--calibrate', action='store_true', help="measure the model's characters per token on the corpus")
+    args = parser.parse_args()
+
+    if args.calibrate:
+        calibrate_token_estimate(args)
+        return
+
+    if args.prompt_layouts:
+        benchmark_prompt_layouts(args)
+        return
+
+    if args.pipeline:
+        app.config['LLM_BACKEND'] = args.backend
+        if args.latency is not None:
+            app.config['LLM_STUB_LATENCY'] = args.latency
+        # Every upload should reach the backend, not replay a cached reply
+        app.config['LLM_CACHE_ENABLED'] = False
+        load_test_pipeline(args)
+        return
+
+    print(f"{'engine':<10} {'pages':>7} {'chars':>10} {'seconds':>9} {'pages/sec':>10}")
+    for engine in args.engines:
+        # Keeps the fastest run so one-off disk/cache noise doesn't skew the comparison
+        pages, chars, elapsed = min((benchmark_engine(engine, args.pdfs) for _ in range(args.repeat)), key=lambda run: run[2])
+        print(f"{engine:<10} {pages:>7} {chars:>10} {elapsed:>9.3f} {pages / elapsed if elapsed else 0:>10.1f}")
+
+
+# Only runs the benchmark if this file is being run directly
+if __name__ == '__main__':
+    main()
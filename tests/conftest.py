@@ -0,0 +1,124 @@
+import io
+import os
+import sys
+import threading
+
+# Settings have to be in the environment before app is imported, since app reads them at import time -
+# tests never load a model or call a model server, they run on the deterministic stub backend
+os.environ.setdefault('FLASK_LLM_WARM_ON_STARTUP', 'false')
+os.environ.setdefault('FLASK_LLM_BACKEND', 'stub')
+os.environ.setdefault('FLASK_LLM_STUB_LATENCY', '0')
+os.environ.setdefault('FLASK_LLM_STUB_CHARS_PER_SECOND', '0')
+os.environ.setdefault('FLASK_LLM_CACHE_ENABLED', 'false')
+
+# Makes app.py importable when pytest is run from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httplib2
+import pypdfium2 as pdfium
+import pytest
+from googleapiclient.errors import HttpError
+
+import app as app_module
+
+
+# Every test starts from the configured characters-per-token ratio, whatever an earlier test calibrated
+@pytest.fixture(autouse=True)
+def reset_token_estimate():
+    app_module._chars_per_token = None
+    yield
+    app_module._chars_per_token = None
+
+
+# Every test gets its own empty job store
+@pytest.fixture(autouse=True)
+def job_store(tmp_path, monkeypatch):
+    path = str(tmp_path / 'jobs.sqlite3')
+    monkeypatch.setitem(app_module.app.config, 'JOB_STORE_PATH', path)
+    return path
+
+
+# In-memory stand-in for the Google Calendar service - supports the list, insert and batch calls the app makes
+class FakeCalendarRequest:
+    def __init__(self, run, body=None):
+        self.run = run
+        self.body = body
+
+    def execute(self, num_retries=0):
+        return self.run()
+
+
+class FakeCalendarBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batch_sizes.append(len(self.requests))
+        if self.service.failing_batches:
+            self.service.failing_batches -= 1
+            raise HttpError(httplib2.Response({'status': 503}), b'backend error')
+        for request_id, request in self.requests:
+            # Events named in reject_once fail inside their batch the first time only
+            if request.body['summary'] in self.service.reject_once:
+                self.service.reject_once.discard(request.body['summary'])
+                self.callback(request_id, None, HttpError(httplib2.Response({'status': 500}), b'insert failed'))
+            else:
+                self.callback(request_id, request.execute(), None)
+
+
+class FakeCalendarService:
+    def __init__(self):
+        self.inserted = []
+        self.batch_sizes = []
+        self.failing_batches = 0
+        self.reject_once = set()
+        self.lock = threading.Lock()
+
+    def events(self):
+        return self
+
+    def list(self, calendarId, privateExtendedProperty, maxResults, pageToken, fields):
+        course = privateExtendedProperty.split('=', 1)[1]
+        with self.lock:
+            items = [body for body in self.inserted if body['extendedProperties']['private']['syllabusCourse'] == course]
+        return FakeCalendarRequest(lambda: {'items': items})
+
+    def insert(self, calendarId, body):
+        def run():
+            with self.lock:
+                self.inserted.append(body)
+            return {'htmlLink': f"https://calendar.example/{len(self.inserted)}"}
+        return FakeCalendarRequest(run, body)
+
+    def new_batch_http_request(self, callback):
+        return FakeCalendarBatch(self, callback)
+
+    def summaries(self):
+        with self.lock:
+            return [body['summary'] for body in self.inserted]
+
+
+@pytest.fixture
+def fake_calendar(monkeypatch):
+    service = FakeCalendarService()
+    monkeypatch.setattr(app_module, 'get_calendar_service', lambda metrics=None: service)
+    return service
+
+
+# Builds a PDF with the given number of blank pages
+@pytest.fixture
+def make_pdf():
+    def build(pages):
+        pdf = pdfium.PdfDocument.new()
+        for _ in range(pages):
+            pdf.new_page(612, 792)
+        out = io.BytesIO()
+        pdf.save(out)
+        pdf.close()
+        return out.getvalue()
+    return build
@@ -0,0 +1,28 @@
+import asyncio
+import json
+
+from app import app, StubBackend, extract_events_with_ollama, STUB_DEFAULT_RESPONSE
+
+
+def test_stub_backend_reports_no_prompt_tokens():
+    async def final_part():
+        parts = [part async for part in StubBackend(app.config).stream_chat('stub', [{'role': 'user', 'content': 'x' * 400}])]
+        return parts[-1]
+
+    part = asyncio.run(final_part())
+    assert part['done']
+    assert part['prompt_eval_count'] == 0
+
+
+def test_stub_pipeline_end_to_end():
+    metrics = {}
+    streamed = []
+    failed_sections = []
+    text = '\n'.join(f'Week {number}: Homework {number} due Sept {number + 1}' for number in range(1, 30))
+
+    events = extract_events_with_ollama(text, metrics, on_event=streamed.append, failed_sections=failed_sections)
+
+    # The stub always replies with the same event, so every chunk's copy collapses into one
+    assert events == json.loads(STUB_DEFAULT_RESPONSE)
+    assert streamed and all(event == events[0] for event in streamed)
+    assert not failed_sections
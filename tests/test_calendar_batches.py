@@ -0,0 +1,47 @@
+from app import app, add_events_to_calendar
+
+
+def homework(count):
+    return [{'event': f'Homework {number}', 'date': f'Oct {number}'} for number in range(1, count + 1)]
+
+
+def test_events_are_inserted_in_batches_of_at_most_50(monkeypatch, fake_calendar):
+    monkeypatch.setitem(app.config, 'CALENDAR_BATCH_SIZE', 100)
+    events = [{'event': f'Reading {number}', 'date': f'{month} {number}'} for month in ('Oct', 'Nov') for number in range(1, 31)]
+    metrics = {}
+
+    assert add_events_to_calendar(events, metrics, 'CS 101') == (60, 0)
+
+    # Capped at the API's 50 requests per batch, with one callback per event
+    assert fake_calendar.batch_sizes == [50, 10]
+    assert metrics['Calendar inserts'] == ('60 of 60 added in 2 batch requests, 0 retried individually, 0 failed, '
+                                           '0 skipped as already imported')
+
+
+def test_batch_size_setting_splits_smaller_uploads(monkeypatch, fake_calendar):
+    monkeypatch.setitem(app.config, 'CALENDAR_BATCH_SIZE', 2)
+
+    assert add_events_to_calendar(homework(5), None, 'CS 101') == (5, 0)
+    assert fake_calendar.batch_sizes == [2, 2, 1]
+
+
+def test_each_insert_that_fails_in_a_batch_is_retried_on_its_own(fake_calendar):
+    fake_calendar.reject_once = {'Homework 2'}
+    metrics = {}
+
+    assert add_events_to_calendar(homework(3), metrics, 'CS 101') == (3, 0)
+
+    assert fake_calendar.summaries() == ['Homework 1', 'Homework 3', 'Homework 2']
+    assert metrics['Calendar inserts'].startswith('3 of 3 added in 1 batch requests, 1 retried individually, 0 failed')
+
+
+def test_a_failed_batch_request_retries_every_event_in_it(monkeypatch, fake_calendar):
+    monkeypatch.setitem(app.config, 'CALENDAR_BATCH_SIZE', 2)
+    fake_calendar.failing_batches = 1
+    metrics = {}
+
+    assert add_events_to_calendar(homework(3), metrics, 'CS 101') == (3, 0)
+
+    # The first batch failed outright, so its two events were sent individually after the second batch
+    assert fake_calendar.summaries() == ['Homework 3', 'Homework 1', 'Homework 2']
+    assert metrics['Calendar inserts'].startswith('3 of 3 added in 1 batch requests, 2 retried individually, 0 failed')
@@ -0,0 +1,87 @@
+import io
+import time
+
+import app as app_module
+from app import app, CalendarSync, create_job, get_job, run_upload_job
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, 'timed out waiting'
+        time.sleep(0.01)
+
+
+def test_events_are_sent_in_batches_while_extraction_runs(monkeypatch, fake_calendar):
+    monkeypatch.setitem(app.config, 'CALENDAR_STREAM_INTERVAL', 0.05)
+    metrics = {}
+    sync = CalendarSync('CS 101', metrics)
+
+    sync.add({'event': 'Homework 1', 'date': 'Sept 15'})
+    sync.add({'event': 'Homework 2', 'date': 'Sept 22'})
+    # Sent as one batch once the interval passes, without waiting for finish()
+    wait_for(lambda: len(fake_calendar.inserted) == 2)
+    assert fake_calendar.batch_sizes == [2]
+
+    # The final list only adds what wasn't streamed
+    added, skipped = sync.finish([{'event': 'Homework 1', 'date': 'Sept 15'}, {'event': 'Midterm', 'date': 'Oct 20'}])
+
+    assert (added, skipped) == (3, 0)
+    assert fake_calendar.summaries() == ['Homework 1', 'Homework 2', 'Midterm']
+    assert metrics['Calendar inserts'].endswith('2 sent while extraction was still running')
+
+
+def test_full_batches_go_out_without_waiting_for_the_interval(monkeypatch, fake_calendar):
+    monkeypatch.setitem(app.config, 'CALENDAR_STREAM_INTERVAL', 60)
+    monkeypatch.setitem(app.config, 'CALENDAR_BATCH_SIZE', 2)
+    sync = CalendarSync('CS 101')
+
+    for number in range(1, 4):
+        sync.add({'event': f'Quiz {number}', 'date': f'Oct {number}'})
+    wait_for(lambda: len(fake_calendar.inserted) == 2)
+
+    assert sync.finish([]) == (3, 0)
+    assert fake_calendar.batch_sizes == [2, 1]
+
+
+def test_upload_job_adds_events_before_extraction_finishes(monkeypatch, fake_calendar):
+    monkeypatch.setitem(app.config, 'CALENDAR_STREAM_INTERVAL', 0.05)
+    monkeypatch.setitem(app.config, 'LLM_ESCALATION_MODEL', '')
+    seen_during_extraction = []
+
+    def fake_extraction(source, engine, metrics, on_event=None, **kwargs):
+        event = {'event': 'Final exam', 'date': 'Dec 12'}
+        on_event(event)
+        # The event reaches the calendar while this "extraction" is still running
+        wait_for(lambda: fake_calendar.summaries() == ['Final exam'])
+        seen_during_extraction.append(True)
+        return 'text', [event]
+
+    monkeypatch.setattr(app_module, 'extract_syllabus_events', fake_extraction)
+    job = create_job('syllabus.pdf')
+    run_upload_job(job, io.BytesIO(b'%PDF'), 'fast', 'interactive', None, 'CS 101')
+
+    assert seen_during_extraction == [True]
+    finished = get_job(job['id'])
+    assert finished['status'] == 'done'
+    assert finished['partial_events'] == [{'event': 'Final exam', 'date': 'Dec 12'}]
+    assert fake_calendar.summaries() == ['Final exam']
+
+
+def test_cascade_keeps_inserts_until_extraction_is_done(monkeypatch, fake_calendar):
+    monkeypatch.setitem(app.config, 'CALENDAR_STREAM_INTERVAL', 0.01)
+    monkeypatch.setitem(app.config, 'LLM_ESCALATION_MODEL', 'larger-model')
+
+    def fake_extraction(source, engine, metrics, on_event=None, **kwargs):
+        on_event({'event': 'Draft', 'date': 'Nov 1'})
+        time.sleep(0.1)
+        assert fake_calendar.summaries() == []
+        # The larger model replaced the streamed event
+        return 'text', [{'event': 'Final draft', 'date': 'Nov 1'}]
+
+    monkeypatch.setattr(app_module, 'extract_syllabus_events', fake_extraction)
+    job = create_job('syllabus.pdf')
+    run_upload_job(job, io.BytesIO(b'%PDF'), 'fast', 'interactive', None, 'CS 101')
+
+    assert get_job(job['id'])['status'] == 'done'
+    assert fake_calendar.summaries() == ['Final draft']
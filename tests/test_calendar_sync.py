@@ -0,0 +1,60 @@
+from app import calendar_sync_hash, build_event_body, add_events_to_calendar
+
+
+def test_sync_hash_ignores_case_and_spacing():
+    assert calendar_sync_hash('CS 101', 'Homework 1', '2025-09-15') == calendar_sync_hash('cs  101', ' homework 1 ', '2025-09-15')
+    assert len(calendar_sync_hash('CS 101')) == 32
+
+
+def test_sync_hash_keeps_parts_apart():
+    # Parts are joined with a separator, so moving text between them changes the hash
+    assert calendar_sync_hash('CS 1', '01 Homework') != calendar_sync_hash('CS 101', 'Homework')
+    assert calendar_sync_hash('CS 101', 'Homework 1', '2025-09-15') != calendar_sync_hash('CS 101', 'Homework 1', '2025-09-16')
+    assert calendar_sync_hash('CS 101', 'Homework 1', '2025-09-15') != calendar_sync_hash('CS 102', 'Homework 1', '2025-09-15')
+
+
+def test_event_body_is_tagged_for_later_syncs():
+    body = build_event_body({'event': 'Homework 1', 'date': 'Sept 15'}, 'CS 101')
+    date = body['start']['date']
+
+    assert body['summary'] == 'Homework 1'
+    assert body['extendedProperties']['private'] == {
+        'syllabusCourse': calendar_sync_hash('CS 101'),
+        'syllabusEvent': calendar_sync_hash('CS 101', 'Homework 1', date),
+    }
+    # The same event written differently is recognised as already imported
+    again = build_event_body({'event': 'homework 1', 'date': 'September 15th'}, 'cs 101')
+    assert again['extendedProperties'] == body['extendedProperties']
+
+
+def test_event_body_skips_unparseable_dates():
+    assert build_event_body({'event': 'Essay', 'date': 'TBA'}, 'CS 101') is None
+
+
+def test_second_import_skips_events_already_in_the_calendar(fake_calendar):
+    events = [{'event': 'Homework 1', 'date': 'Sept 15'}, {'event': 'Midterm', 'date': 'Oct 20'}]
+    assert add_events_to_calendar(events, None, 'CS 101') == (2, 0)
+
+    # Written differently, plus one new event and one with no usable date
+    metrics = {}
+    again = [{'event': 'homework 1', 'date': 'September 15th'}, {'event': 'Midterm', 'date': 'Oct 20'},
+             {'event': 'Final', 'date': 'Dec 12'}, {'event': 'Essay', 'date': 'TBA'}]
+
+    assert add_events_to_calendar(again, metrics, 'CS 101') == (1, 2)
+    assert fake_calendar.summaries() == ['Homework 1', 'Midterm', 'Final']
+    assert metrics['Calendar inserts'].endswith('2 skipped as already imported')
+
+
+def test_repeats_within_one_upload_are_added_once_and_not_counted_as_skipped(fake_calendar):
+    events = [{'event': 'Quiz 1', 'date': 'Sept 9'}, {'event': 'quiz  1', 'date': 'September 9'}]
+
+    assert add_events_to_calendar(events, None, 'CS 101') == (1, 0)
+    assert fake_calendar.summaries() == ['Quiz 1']
+
+
+def test_other_courses_events_are_not_skipped(fake_calendar):
+    event = [{'event': 'Homework 1', 'date': 'Sept 15'}]
+    add_events_to_calendar(event, None, 'CS 101')
+
+    assert add_events_to_calendar(event, None, 'CS 102') == (1, 0)
+    assert len(fake_calendar.inserted) == 2
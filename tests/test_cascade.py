@@ -0,0 +1,70 @@
+import pytest
+
+import app as app_module
+from app import cascade_summary
+
+
+class FinishedTask:
+    # Stands in for a chunk's finished asyncio task
+    def __init__(self, elapsed, cache_hit=False):
+        self.value = {'elapsed': elapsed, 'cache_hit': cache_hit}
+
+    def cancelled(self):
+        return False
+
+    def exception(self):
+        return None
+
+    def result(self):
+        return self.value
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    # The larger model has averaged 10s per chunk
+    monkeypatch.setattr(app_module, 'STATS', {'llm_escalation_calls': 2, 'llm_escalation_seconds': 20.0})
+    return app_module.STATS
+
+
+def results(*chunks):
+    return {index: FinishedTask(*chunk).result() for index, chunk in enumerate(chunks)}
+
+
+def test_saving_compares_the_uncached_chunks_only(stats):
+    # Chunk 1 hit the cache, chunk 2 was escalated after 2s on the small model
+    small = results((2.0,), (0.0, True), (2.0,))
+    escalated = {2: (FinishedTask(10.0), True)}
+
+    summary = cascade_summary(3, small, escalated, 'larger-model')
+
+    # 2 chunks at 10s each on the larger model, against 2s + 2s + 10s actually spent
+    assert summary == ('1 of 3 chunks escalated to larger-model (1 kept its output), '
+                       '~6.0s of model time saved vs. larger-model on every uncached chunk (2 at 10.0s each)')
+    assert stats['llm_cascade_seconds_saved'] == 6.0
+
+
+def test_escalation_cache_hits_are_left_out_too(stats):
+    small = results((2.0,), (2.0,))
+    escalated = {1: (FinishedTask(0.0, True), True)}
+
+    assert cascade_summary(2, small, escalated, 'larger-model').endswith('~8.0s of model time saved vs. larger-model '
+                                                                         'on every uncached chunk (1 at 10.0s each)')
+
+
+def test_cascade_that_cost_time_says_so(stats):
+    small = results((4.0,))
+    escalated = {0: (FinishedTask(10.0), False)}
+
+    summary = cascade_summary(1, small, escalated, 'larger-model')
+
+    assert summary.endswith('~4.0s more model time than larger-model on every uncached chunk (1 at 10.0s each)')
+    assert '~-' not in summary
+    assert stats['llm_cascade_seconds_saved'] == -4.0
+
+
+def test_all_cache_hits_have_nothing_to_compare(stats):
+    summary = cascade_summary(2, results((0.0, True), (0.0, True)), {}, 'larger-model')
+
+    assert summary == ('0 of 2 chunks escalated to larger-model (0 kept its output), '
+                       'no model time to compare (every chunk hit the cache or timed out)')
+    assert 'llm_cascade_seconds_saved' not in stats
@@ -0,0 +1,83 @@
+import pytest
+
+from app import (app, pack_chunks, calibrate_token_estimate, chars_per_token, extract_events_with_ollama, prompt_token_budget,
+                 ConfigurationError)
+
+
+def syllabus_lines(count):
+    return [f'Week {number:03d}: reading and problem set' for number in range(count)]
+
+
+def test_blank_text_has_no_chunks():
+    assert pack_chunks('', 50, 10) == []
+    assert pack_chunks('\n  \n', 50, 10) == []
+
+
+def test_chunks_cover_text_in_order_within_budget():
+    lines = syllabus_lines(40)
+    chunks = pack_chunks('\n'.join(lines), 50, 0)
+
+    assert len(chunks) > 1
+    budget_chars = 50 * chars_per_token()
+    assert all(len(chunk) <= budget_chars for chunk in chunks)
+    # Without overlap, the chunks are the text split at line boundaries
+    assert [line for chunk in chunks for line in chunk.splitlines()] == lines
+
+
+def test_overlap_repeats_last_lines_of_previous_chunk():
+    lines = syllabus_lines(40)
+    chunks = pack_chunks('\n'.join(lines), 50, 10)
+
+    for previous, current in zip(chunks, chunks[1:]):
+        carried = current.splitlines()[0]
+        assert carried == previous.splitlines()[-1]
+        # Only as much as the overlap budget is repeated
+        assert len(carried) + 1 <= 10 * chars_per_token()
+
+    # Every line still appears, in order, once the repeated lines are taken out
+    seen = []
+    for chunk in chunks:
+        seen.extend(line for line in chunk.splitlines() if not seen or line > seen[-1])
+    assert seen == lines
+
+
+def test_long_line_is_split_to_fit():
+    chunks = pack_chunks('x' * 1000, 50, 0)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 50 * chars_per_token() for chunk in chunks)
+    assert ''.join(chunk.rstrip('\n') for chunk in chunks) == 'x' * 1000
+
+
+def test_boundaries_stay_put_across_uploads():
+    text = '\n'.join(syllabus_lines(200))
+    first = pack_chunks(text, 50, 10)
+
+    # Running the pipeline (which used to recalibrate the estimator from every reply) must not move the boundaries,
+    # or the response cache misses on the next upload of the same syllabus
+    extract_events_with_ollama(text)
+    assert pack_chunks(text, 50, 10) == first
+
+
+def test_calibration_is_quantized_and_explicit():
+    assert chars_per_token() == app.config['LLM_CHARS_PER_TOKEN']
+
+    # Measurements that differ by noise give the same ratio
+    assert calibrate_token_estimate(1000, 270) == 3.75
+    assert calibrate_token_estimate(1000, 266) == 3.75
+    assert chars_per_token() == 3.75
+
+    # Without a token count the estimator is left alone
+    assert calibrate_token_estimate(1000, 0) is None
+    assert chars_per_token() == 3.75
+
+
+def test_context_too_small_for_the_text_is_a_configuration_error(monkeypatch):
+    monkeypatch.setitem(app.config, 'LLM_NUM_CTX', 1024)
+    monkeypatch.setitem(app.config, 'LLM_OUTPUT_TOKENS', 1000)
+
+    with pytest.raises(ConfigurationError, match='LLM_NUM_CTX'):
+        prompt_token_budget()
+    # Raised before any model call, rather than packing the syllabus into thousands of tiny prompts
+    with pytest.raises(ConfigurationError):
+        extract_events_with_ollama('Homework 1 due Sept 15\n' * 50)
@@ -0,0 +1,31 @@
+from app import DATE_PATTERN, score_date_density, filter_dated_pages, estimate_tokens
+
+
+def test_date_pattern_skips_modal_may_and_scores():
+    assert not DATE_PATTERN.search('Students in groups of 3 may work together')
+    assert not DATE_PATTERN.search('Scored 85/100 and 10/20 points')
+    assert DATE_PATTERN.search('Due 3 May 2025').group() == '3 May'
+    assert DATE_PATTERN.search('Due 12/31').group() == '12/31'
+
+
+def test_density_counts_dates_per_thousand_chars():
+    page = next(score_date_density([{'page': 1, 'text': 'Homework due Sept 15, quiz on Oct 2', 'chars': 35}]))
+
+    assert page['dates'] == 2
+    assert page['density'] == 2 * 1000 / 35
+    # An empty page has no density rather than dividing by zero
+    assert next(score_date_density([{'page': 2, 'text': '', 'chars': 0}]))['density'] == 0.0
+
+
+def test_prefilter_reports_dropped_text_against_the_whole_document():
+    pages = list(score_date_density([
+        {'page': 1, 'text': 'Sept 8 Sept 15 Sept 22', 'chars': 22},
+        {'page': 2, 'text': 'Academic integrity policy ' * 4, 'chars': 104},
+    ]))
+    metrics = {}
+
+    kept = filter_dated_pages(pages, metrics, total_chars=400)
+
+    assert kept == pages[:1]
+    # The dropped page plus its newline, estimated with the same ratio as the rest of the pipeline
+    assert metrics['Text dropped before LLM'] == f"105 of 400 chars (~{estimate_tokens('x' * 105)} tokens)"
@@ -0,0 +1,59 @@
+from app import IncrementalEventParser, dedupe_events, event_key
+
+
+def test_parser_returns_events_as_their_objects_close():
+    parser = IncrementalEventParser()
+    reply = '[{"event": "Homework 1", "date": "Sept 15"}, {"event": "Midterm", "date": "Oct 20"}]'
+
+    # Fed one character at a time, each event comes out on the piece holding its closing brace
+    seen = []
+    for position, char in enumerate(reply):
+        for event in parser.feed(char):
+            seen.append((position, event['event']))
+
+    assert seen == [(reply.index('}'), 'Homework 1'), (reply.rindex('}'), 'Midterm')]
+    assert parser.complete
+
+
+def test_parser_ignores_braces_inside_strings_and_surrounding_text():
+    parser = IncrementalEventParser()
+    events = parser.feed('Here are the events:\n[{"event": "Lab {3} \\"draft\\"", "date": "Nov 2"}]\nDone.')
+
+    assert events == [{'event': 'Lab {3} "draft"', 'date': 'Nov 2'}]
+    assert parser.complete
+
+
+def test_parser_skips_malformed_objects_only():
+    parser = IncrementalEventParser()
+    events = parser.feed('[{"event": "Quiz 1"}, {"event": "Quiz 2", "date": "Sept 9"}, {not json}]')
+
+    assert events == [{'event': 'Quiz 2', 'date': 'Sept 9'}]
+    assert parser.malformed == 2
+    assert not parser.complete
+
+
+def test_parser_is_incomplete_until_the_array_closes():
+    parser = IncrementalEventParser()
+    parser.feed('[{"event": "Final", "date": "Dec 12"}')
+
+    assert not parser.complete
+    parser.feed(']')
+    assert parser.complete
+
+
+def test_event_key_ignores_case_spacing_and_date_format():
+    assert event_key({'event': 'Homework  1', 'date': 'Sept 15'}) == event_key({'event': 'homework 1', 'date': 'September 15th'})
+    assert event_key({'event': 'Homework 1', 'date': 'Sept 15'}) != event_key({'event': 'Homework 1', 'date': 'Sept 16'})
+    # Dates that can't be parsed are compared as text
+    assert event_key({'event': 'Essay', 'date': 'TBA'}) == ('essay', 'tba')
+
+
+def test_dedupe_keeps_first_seen_order():
+    events = [
+        {'event': 'Homework 1', 'date': 'Sept 15'},
+        {'event': 'Midterm', 'date': 'Oct 20'},
+        {'event': 'homework 1', 'date': 'September 15'},
+        {'event': 'Homework 1', 'date': 'Sept 22'},
+    ]
+
+    assert dedupe_events(events) == [events[0], events[1], events[3]]
@@ -0,0 +1,93 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app as app_module
+from app import app, extract_pdf_pages, limit_extraction_memory, ExtractionLimitError
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    # Runs "worker" tasks on threads and records what each was asked to do, with the memory each task reports set per test
+    calls = []
+    growth = {}
+
+    def fake_extract_page_range(pdf, start, stop, engine, max_memory_mb):
+        calls.append((type(pdf), start, stop, max_memory_mb))
+        return [{'page': number + 1, 'text': '', 'chars': 0} for number in range(start, stop)], growth.get(start, 0)
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(app_module, 'get_extract_pool', lambda: pool)
+    monkeypatch.setattr(app_module, 'extract_page_range', fake_extract_page_range)
+    monkeypatch.setattr(app_module, 'spill_to_temp_file', lambda source: '/nonexistent/spilled.pdf')
+    monkeypatch.setattr(app_module.os, 'remove', lambda path: None)
+    monkeypatch.setitem(app.config, 'EXTRACT_PAGES_PER_TASK', 8)
+    monkeypatch.setitem(app.config, 'EXTRACT_PARALLEL_MIN_PAGES', 24)
+    yield calls, growth
+    pool.shutdown()
+
+
+def use_document(monkeypatch, page_count, workers, max_memory_mb):
+    monkeypatch.setattr(app_module, 'count_pdf_pages', lambda source: page_count)
+    monkeypatch.setitem(app.config, 'EXTRACT_WORKERS', workers)
+    monkeypatch.setitem(app.config, 'EXTRACT_MAX_MEMORY_MB', max_memory_mb)
+
+
+def test_small_document_with_a_ceiling_runs_as_one_worker_task(monkeypatch, fake_pool):
+    calls, _ = fake_pool
+    use_document(monkeypatch, page_count=5, workers=1, max_memory_mb=1024)
+    metrics = {}
+
+    pages = list(extract_pdf_pages(io.BytesIO(b'%PDF'), 'fast', metrics))
+
+    assert [page['page'] for page in pages] == [1, 2, 3, 4, 5]
+    # Sent as bytes, not spilled to disk, with the whole ceiling for its one task
+    assert calls == [(bytes, 0, 5, 1024)]
+    assert metrics['Extraction'] == '1 worker task, up to 1 at once'
+
+
+def test_without_a_ceiling_small_documents_stay_in_the_server_process(monkeypatch, fake_pool):
+    calls, _ = fake_pool
+    use_document(monkeypatch, page_count=3, workers=1, max_memory_mb=0)
+    monkeypatch.setitem(app_module.EXTRACTION_ENGINES, 'fast', lambda source: iter([{'page': 1, 'text': 'x', 'chars': 1}]))
+    metrics = {}
+
+    assert len(list(extract_pdf_pages(io.BytesIO(b'%PDF'), 'fast', metrics))) == 1
+    assert calls == []
+    assert metrics['Extraction'] == 'serial, in the server process (no memory ceiling)'
+
+
+def test_parallel_ranges_share_the_ceiling_and_their_growth_is_summed(monkeypatch, fake_pool):
+    calls, growth = fake_pool
+    use_document(monkeypatch, page_count=32, workers=4, max_memory_mb=100)
+    growth.update({0: 10 * MB, 8: 20 * MB, 16: 5 * MB, 24: 5 * MB})
+    metrics = {}
+
+    assert len(list(extract_pdf_pages('syllabus.pdf', 'fast', metrics))) == 32
+    assert [call[1:] for call in calls] == [(0, 8, 25), (8, 16, 25), (16, 24, 25), (24, 32, 25)]
+    assert metrics['Memory added during extraction'] == '40 MB across all worker tasks'
+
+
+def test_summed_growth_over_the_ceiling_stops_extraction(monkeypatch, fake_pool):
+    _, growth = fake_pool
+    use_document(monkeypatch, page_count=32, workers=2, max_memory_mb=100)
+    growth.update({0: 45 * MB, 8: 45 * MB, 16: 45 * MB})
+
+    with pytest.raises(ExtractionLimitError, match='stopped at page 24'):
+        list(extract_pdf_pages('syllabus.pdf', 'fast', {}))
+
+
+def test_memory_guard_measures_growth_from_its_own_baseline(monkeypatch):
+    readings = iter([500 * MB, 501 * MB, 503 * MB, 520 * MB])
+    monkeypatch.setattr(app_module, 'current_rss', lambda: next(readings))
+    pages = ({'page': number, 'text': '', 'chars': 0} for number in (1, 2, 3))
+    stats = {}
+
+    guarded = limit_extraction_memory(pages, stats, 10)
+    assert [page['page'] for page in (next(guarded), next(guarded))] == [1, 2]
+    assert stats['peak_growth'] == 3 * MB
+    with pytest.raises(ExtractionLimitError, match='stopped at page 3'):
+        next(guarded)
@@ -0,0 +1,83 @@
+import io
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import app as app_module
+from app import app, create_job, update_job, add_job_event, get_job, count_active_jobs
+
+
+@pytest.fixture
+def client(monkeypatch, fake_calendar):
+    # Extracts in the server process so the test doesn't start extraction workers
+    monkeypatch.setitem(app.config, 'EXTRACT_MAX_MEMORY_MB', 0)
+    monkeypatch.setitem(app.config, 'TESTING', True)
+    return app.test_client()
+
+
+def wait_for_job(client, status_url, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        job = client.get(status_url, headers={'Accept': 'application/json'}).get_json()
+        if job['status'] in ('done', 'failed') or time.perf_counter() > deadline:
+            return job
+        time.sleep(0.02)
+
+
+def test_upload_returns_a_job_that_finishes(client, make_pdf):
+    response = client.post('/upload', data={'file': (io.BytesIO(make_pdf(2)), 'syllabus.pdf')},
+                           headers={'Accept': 'application/json'})
+
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+    assert response.headers['Location'].endswith(status_url)
+
+    job = wait_for_job(client, status_url)
+    assert job['status'] == 'done'
+    assert job['filename'] == 'syllabus.pdf'
+    assert job['messages'] == ['File processed but no events were detected.']
+    assert job['metrics']['Extraction engine'] == app.config['EXTRACTION_ENGINE']
+    # Finished jobs render the results page
+    assert b'Back to Home' in client.get(status_url).data
+
+
+def test_unknown_jobs_are_404_for_api_clients(client):
+    response = client.get('/jobs/nope?format=json')
+
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Unknown or expired job'}
+
+
+def test_job_progress_is_visible_to_other_processes(job_store):
+    job = create_job('syllabus.pdf')
+    update_job(job, status='running', stage='Extracting events with the language model')
+    add_job_event(job, {'event': 'Homework 1', 'date': 'Sept 15'})
+
+    # Another server worker process reads the same job store
+    script = ('import json, app; job = app.get_job(%r); '
+              'print(json.dumps([job["status"], job["stage"], job["partial_events"]]))' % job['id'])
+    env = dict(os.environ, FLASK_JOB_STORE_PATH=job_store, FLASK_LLM_WARM_ON_STARTUP='false')
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, env=env, check=True,
+                            cwd=os.path.dirname(app_module.__file__)).stdout
+
+    assert output.strip().splitlines()[-1] == ('["running", "Extracting events with the language model", '
+                                               '[{"event": "Homework 1", "date": "Sept 15"}]]')
+
+
+def test_only_the_newest_finished_jobs_are_kept(monkeypatch):
+    monkeypatch.setitem(app.config, 'JOB_HISTORY', 2)
+    jobs = [create_job(f'syllabus-{number}.pdf') for number in range(3)]
+    for number, job in enumerate(jobs):
+        add_job_event(job, {'event': f'Quiz {number}', 'date': 'Oct 1'})
+        update_job(job, status='done', finished=time.time() + number)
+    running = create_job('running.pdf')
+
+    # The oldest finished job and its events are dropped, unfinished jobs are never dropped
+    assert get_job(jobs[0]['id']) is None
+    assert [get_job(job['id'])['partial_events'] for job in jobs[1:]] == [[{'event': 'Quiz 1', 'date': 'Oct 1'}],
+                                                                          [{'event': 'Quiz 2', 'date': 'Oct 1'}]]
+    assert get_job(running['id'])['status'] == 'queued'
+    assert count_active_jobs() == 1
@@ -0,0 +1,59 @@
+import pytest
+
+import app as app_module
+from app import app, extract_events_with_ollama, load_cached_response, store_cached_response, StubBackend
+
+
+@pytest.fixture
+def llm_cache(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'LLM_CACHE_PATH', str(tmp_path / 'llm_responses.sqlite3'))
+    monkeypatch.setitem(app.config, 'LLM_CACHE_ENABLED', True)
+    monkeypatch.setattr(app_module, 'STATS', {})
+    return app_module.STATS
+
+
+def test_every_part_of_the_key_must_match(llm_cache):
+    key = ('model', 'digest-1', 2, 'chunk-hash')
+    store_cached_response(key, '[]')
+
+    assert load_cached_response(key) == '[]'
+    # A new model build, prompt version or chunk is a miss
+    assert load_cached_response(('model', 'digest-2', 2, 'chunk-hash')) is None
+    assert load_cached_response(('model', 'digest-1', 3, 'chunk-hash')) is None
+    assert load_cached_response(('model', 'digest-1', 2, 'other-hash')) is None
+    assert (llm_cache['llm_cache_hits'], llm_cache['llm_cache_misses']) == (1, 3)
+
+
+def test_least_recently_used_replies_are_dropped(llm_cache, monkeypatch):
+    monkeypatch.setitem(app.config, 'LLM_CACHE_MAX_ENTRIES', 2)
+    clock = iter(range(100))
+    monkeypatch.setattr(app_module.time, 'time', lambda: next(clock))
+
+    store_cached_response(('m', 'd', 1, 'old'), '"old"')
+    store_cached_response(('m', 'd', 1, 'used'), '"used"')
+    load_cached_response(('m', 'd', 1, 'old'))
+    store_cached_response(('m', 'd', 1, 'new'), '"new"')
+
+    # 'used' was the least recently used once 'old' was read again
+    assert load_cached_response(('m', 'd', 1, 'used')) is None
+    assert load_cached_response(('m', 'd', 1, 'old')) == '"old"'
+    assert load_cached_response(('m', 'd', 1, 'new')) == '"new"'
+
+
+def test_second_upload_of_the_same_text_is_served_from_the_cache(llm_cache, monkeypatch):
+    monkeypatch.setattr(app_module, '_llm_backend', StubBackend(app.config))
+    text = 'Homework 1 due Sept 15'
+
+    first_metrics, second_metrics = {}, {}
+    first = extract_events_with_ollama(text, first_metrics)
+    second = extract_events_with_ollama(text, second_metrics)
+
+    assert first == second
+    assert first_metrics['LLM cache'] == '0 of 1 chunks hit'
+    assert second_metrics['LLM cache'] == '1 of 1 chunks hit'
+
+    # Schema-constrained and free-form replies are cached apart
+    monkeypatch.setitem(app.config, 'LLM_SCHEMA_OUTPUT', not app.config['LLM_SCHEMA_OUTPUT'])
+    other_mode = {}
+    extract_events_with_ollama(text, other_mode)
+    assert other_mode['LLM cache'] == '0 of 1 chunks hit'
@@ -0,0 +1,39 @@
+import app as app_module
+from app import extract_table_events, extract_events_with_rules_by_page, extract_syllabus_events, score_date_density
+
+
+def test_pages_stream_through_table_and_rule_stages():
+    produced = []
+
+    def engine_pages():
+        for number in (1, 2):
+            produced.append(number)
+            yield {'page': number, 'text': f'Homework {number} due Sept {number}', 'chars': 22,
+                   'tables': [], 'text_outside_tables': f'Homework {number} due Sept {number}'}
+
+    metrics = {}
+    events = []
+    pages = extract_events_with_rules_by_page(extract_table_events(score_date_density(engine_pages()), [], metrics), events, {})
+
+    # The first page comes out of every stage before the engine has produced the second
+    assert next(pages)['page'] == 1
+    assert produced == [1]
+    assert [page['page'] for page in pages] == [2]
+    assert [event['event'] for event in events] == ['Homework 1', 'Homework 2']
+    assert metrics['Schedule tables'] == '0 recognised, 0 events read without the LLM'
+
+
+def test_pipeline_reads_text_tables_and_rules_in_one_pass(monkeypatch):
+    pages = [{'page': 1, 'text': 'Week 1\nDate | Due\nSept 8 | Homework 1', 'chars': 38,
+              'tables': [[['Date', 'Due'], ['Sept 8', 'Homework 1']]], 'text_outside_tables': 'Week 1'},
+             {'page': 2, 'text': 'Final exam due Dec 12', 'chars': 21, 'tables': [], 'text_outside_tables': 'Final exam due Dec 12'}]
+    monkeypatch.setattr(app_module, 'get_pdf_pages', lambda source, engine, metrics, digest=None: (iter(pages), True))
+
+    metrics = {}
+    text, events = extract_syllabus_events('syllabus.pdf', 'fast', metrics)
+
+    # Everything was explained without the LLM, and the full text still covers every page
+    assert text == 'Week 1\nDate | Due\nSept 8 | Homework 1\nFinal exam due Dec 12\n'
+    assert events == [{'event': 'Homework 1', 'date': 'Sept 8'}, {'event': 'Final exam', 'date': 'Dec 12', 'confidence': 0.9}]
+    assert metrics['Schedule tables'] == '1 recognised, 1 events read without the LLM'
+    assert metrics['Text left for LLM'] == f'0 of {len(text)} chars (~0 tokens)'
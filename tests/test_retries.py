@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import app as app_module
+from app import app, LLMBackend, estimate_tokens, extract_chunk_events_async, extract_events_with_ollama
+
+
+class ScriptedBackend(LLMBackend):
+    # Gives the next reply in the script on each call, ignoring the prompt - None stands for a failed call
+    def __init__(self, replies):
+        super().__init__(app.config)
+        self.replies = list(replies)
+        self.calls = 0
+
+    async def stream_chat(self, model, messages, schema=None, options=None):
+        reply = self.replies[min(self.calls, len(self.replies) - 1)]
+        self.calls += 1
+        if reply is None:
+            raise ConnectionError('model server went away')
+        yield {'content': reply, 'done': False}
+        yield {'content': '', 'done': True, 'load_duration': 0, 'prompt_eval_count': 0,
+               'prompt_eval_duration': 0, 'eval_count': estimate_tokens(reply)}
+
+    def model_digest(self, model):
+        return None
+
+
+@pytest.fixture
+def script(monkeypatch):
+    monkeypatch.setitem(app.config, 'LLM_CHUNK_RETRIES', 2)
+    monkeypatch.setitem(app.config, 'LLM_RETRY_BACKOFF', 0)
+
+    def use(*replies):
+        backend = ScriptedBackend(replies)
+        monkeypatch.setattr(app_module, '_llm_backend', backend)
+        return backend
+    return use
+
+
+def run_chunk(events, streamed=None):
+    on_event = streamed.append if streamed is not None else (lambda event: None)
+    return asyncio.run(extract_chunk_events_async('Homework 1 due Sept 15', 'stub', None, events, on_event, 'interactive', None))
+
+
+TRUNCATED = '[{"event": "Homework 1", "date": "Sept 15"}, {"event": "Quiz'
+LONGER_TRUNCATED = '[{"event": "Homework 1", "date": "Sept 15"}, {"event": "Quiz 1", "date": "Sept 20"}, {"ev'
+COMPLETE = '[{"event": "Homework 1", "date": "Sept 15"}, {"event": "Quiz 1", "date": "Sept 20"}]'
+
+
+def test_successful_retry_replaces_the_failed_attempts_events(script):
+    backend = script(TRUNCATED, COMPLETE)
+    events = []
+
+    result = run_chunk(events)
+
+    assert backend.calls == 2
+    assert (result['attempts'], result['error'], result['parsed']) == (2, None, True)
+    # Homework 1 was parsed by both attempts but is only kept once
+    assert [event['event'] for event in events] == ['Homework 1', 'Quiz 1']
+
+
+def test_failed_attempts_keep_their_distinct_salvaged_events(script):
+    script(TRUNCATED, None, LONGER_TRUNCATED)
+    events = []
+
+    result = run_chunk(events)
+
+    assert result['attempts'] == 3
+    assert result['error'] == 'reply was not valid JSON'
+    assert [event['event'] for event in events] == ['Homework 1', 'Quiz 1']
+
+
+def test_empty_reply_is_retried_and_counted_as_a_failure(script):
+    backend = script('')
+    events = []
+
+    result = run_chunk(events)
+
+    assert backend.calls == 3
+    assert result['error'] == 'empty reply'
+    assert events == []
+
+
+def test_pipeline_reports_salvaged_sections(script):
+    script(TRUNCATED)
+    failed_sections = []
+
+    events = extract_events_with_ollama('Homework 1 due Sept 15', failed_sections=failed_sections)
+
+    assert events == [{'event': 'Homework 1', 'date': 'Sept 15'}]
+    assert len(failed_sections) == 1
+    assert failed_sections[0].endswith('reply was not valid JSON after 3 attempts, 1 distinct events salvaged')
@@ -0,0 +1,54 @@
+from app import extract_events_with_rules, extract_events_with_rules_by_page, score_date_density
+
+
+def test_rules_pick_up_regular_deadlines():
+    text = 'Homework 1 is due Sept 15.\nFinal Exam: Dec 12\nOct 3: Project proposal'
+
+    events, leftover, coverage = extract_events_with_rules(text)
+
+    assert [(event['event'], event['date']) for event in events] == [
+        ('Homework 1', 'Sept 15'), ('Final Exam', 'Dec 12'), ('Project proposal', 'Oct 3')]
+    assert coverage == 1.0
+    assert leftover == ''
+
+
+def test_low_confidence_matches_are_left_for_the_llm():
+    # A numeric date without a deliverable keyword is only a guess
+    text = 'Office hours move: 10/3\nHomework 2 due Oct 10'
+
+    events, leftover, coverage = extract_events_with_rules(text, min_confidence=0.75)
+
+    assert [event['event'] for event in events] == ['Homework 2']
+    assert 'Office hours move' in leftover
+    assert coverage == 0.5
+
+
+def test_text_without_dates_goes_to_the_llm_whole():
+    assert extract_events_with_rules('No deadlines here.') == ([], 'No deadlines here.', 0.0)
+
+
+def test_rules_run_on_every_page_before_the_prefilter():
+    pages = list(score_date_density([
+        {'page': 1, 'text': 'Course policies and grading.\nFinal exam due Dec 12', 'chars': 50},
+        {'page': 2, 'text': 'Guest lecture Nov 3 and Nov 5, details to follow', 'chars': 48},
+    ]))
+
+    events = []
+    tally = {}
+    leftover_pages = list(extract_events_with_rules_by_page(pages, events, tally))
+
+    assert [event['event'] for event in events] == ['Final exam']
+    # Pages keep their own date scores, with only the unexplained lines left
+    assert [page['dates'] for page in leftover_pages] == [page['dates'] for page in pages]
+    assert leftover_pages[0]['text'] == ''
+    assert leftover_pages[1]['text'] == pages[1]['text']
+    assert (tally['explained'], tally['dates']) == (1, 3)
+
+
+def test_fractions_are_not_read_as_dates():
+    events, leftover, coverage = extract_events_with_rules('Quiz 2 - 1/2 of the grade\nMidterm - 10/20', min_confidence=0.75)
+
+    # Only the real date becomes an event - the fraction isn't a date at all, so nothing is left unexplained
+    assert [(event['event'], event['date']) for event in events] == [('Midterm', '10/20')]
+    assert coverage == 1.0
+    assert leftover == ''
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import time
+
+from app import app, LLMScheduler, scheduler_slots
+
+
+def test_interactive_jobs_go_first_and_users_take_turns():
+    scheduler = LLMScheduler(1)
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    async def blocker():
+        started.set()
+        await asyncio.get_running_loop().run_in_executor(None, release.wait)
+
+    def job(name):
+        async def run():
+            order.append(name)
+            return name
+        return run
+
+    # Holds the only slot while the rest queue up behind it
+    first = scheduler.submit(blocker)
+    assert started.wait(5)
+    futures = [
+        scheduler.submit(job('bulk'), priority='bulk', user='c'),
+        scheduler.submit(job('a1'), user='a'),
+        scheduler.submit(job('a2'), user='a'),
+        scheduler.submit(job('a3'), user='a'),
+        scheduler.submit(job('b1'), user='b'),
+    ]
+    # Submitted jobs are queued on the scheduler thread, so waits for it to catch up
+    deadline = time.perf_counter() + 5
+    while scheduler.snapshot()['llm_queue_depth'] < 5:
+        assert time.perf_counter() < deadline, 'timed out waiting'
+        time.sleep(0.01)
+    assert scheduler.snapshot() == {'llm_queue_depth': 5, 'llm_running': 1, 'llm_slots': 1}
+
+    release.set()
+    first.result(5)
+    assert [future.result(5) for future in futures] == ['bulk', 'a1', 'a2', 'a3', 'b1']
+    # User b doesn't wait behind all of a's chunks, and bulk work waits for every interactive job
+    assert order == ['a1', 'b1', 'a2', 'a3', 'bulk']
+    assert scheduler.snapshot() == {'llm_queue_depth': 0, 'llm_running': 0, 'llm_slots': 1}
+
+
+def test_cancelled_waiting_jobs_never_run():
+    scheduler = LLMScheduler(1)
+    release = threading.Event()
+    ran = []
+
+    async def blocker():
+        await asyncio.get_running_loop().run_in_executor(None, release.wait)
+
+    async def job():
+        ran.append(True)
+
+    scheduler.submit(blocker)
+    waiting = scheduler.submit(job)
+    scheduler.cancel(waiting)
+    release.set()
+
+    assert waiting.cancelled()
+    scheduler.submit(job).result(5)
+    assert ran == [True]
+
+
+def test_processes_split_the_model_slots(monkeypatch):
+    monkeypatch.setitem(app.config, 'LLM_MAX_IN_FLIGHT', 4)
+    monkeypatch.setitem(app.config, 'LLM_SERVER_PROCESSES', 2)
+    assert scheduler_slots() == 2
+
+    # Every process keeps at least one slot, even with more processes than slots
+    monkeypatch.setitem(app.config, 'LLM_SERVER_PROCESSES', 8)
+    assert scheduler_slots() == 1
@@ -0,0 +1,44 @@
+from app import find_table_columns, table_rows_to_events
+
+
+def test_finds_date_and_deliverables_columns_from_header():
+    rows = [['Week', 'Date', 'Topic', 'Due'],
+            ['1', 'Sept 8', 'Introduction', None],
+            ['2', 'Sept 15', 'Sorting', 'Homework 1'],
+            ['3', 'Sept 22', 'Graphs', 'Homework 2']]
+
+    body, date_column, event_column, deliverables = find_table_columns(rows)
+
+    assert body == rows[1:]
+    assert (date_column, event_column, deliverables) == (1, 3, True)
+    events, unmatched = table_rows_to_events(body, date_column, event_column, deliverables)
+    assert events == [{'event': 'Homework 1', 'date': 'Sept 15'}, {'event': 'Homework 2', 'date': 'Sept 22'}]
+    assert unmatched == []
+
+
+def test_header_words_match_whole_words_only():
+    # "Updated" contains "date" but isn't the date column
+    rows = [['Updated', 'When', 'Lecture'],
+            ['yes', 'Oct 1', 'Recursion'],
+            ['no', 'Oct 8', 'Midterm exam']]
+
+    body, date_column, event_column, deliverables = find_table_columns(rows)
+
+    assert (date_column, event_column, deliverables) == (1, 2, False)
+
+
+def test_topic_rows_without_a_deliverable_go_to_the_llm():
+    rows = [['Date', 'Topic'],
+            ['Oct 1', 'Recursion'],
+            ['Oct 8', 'Midterm exam'],
+            ['Oct 15', 'Dynamic programming']]
+
+    events, unmatched = table_rows_to_events(*find_table_columns(rows))
+
+    assert events == [{'event': 'Midterm exam', 'date': 'Oct 8'}]
+    assert unmatched == [rows[1], rows[3]]
+
+
+def test_tables_without_dates_are_not_schedules():
+    assert find_table_columns([['Grade', 'Weight'], ['Homework', '30%'], ['Exams', '70%']]) is None
+    assert find_table_columns([['Only one row']]) is None
@@ -0,0 +1,78 @@
+import io
+import os
+
+import pytest
+
+import app as app_module
+from app import app, get_pdf_pages, hash_source, load_cached_pages, store_cached_pages
+
+
+@pytest.fixture
+def cache_folder(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'PDF_CACHE_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+def pages(text):
+    return [{'page': 1, 'text': text, 'chars': len(text)}]
+
+
+def test_entries_are_kept_per_file_and_engine(cache_folder):
+    assert load_cached_pages('abc', 'fast') is None
+
+    store_cached_pages('abc', 'fast', pages('fast text'))
+
+    assert load_cached_pages('abc', 'fast') == pages('fast text')
+    assert load_cached_pages('abc', 'layout') is None
+    assert load_cached_pages('def', 'fast') is None
+    # Written atomically, with no temporary files left behind
+    assert [name.endswith('.json') for name in os.listdir(cache_folder)] == [True]
+
+
+def test_least_recently_used_entries_are_evicted_first(cache_folder, monkeypatch):
+    store_cached_pages('old', 'fast', pages('x' * 100))
+    store_cached_pages('used', 'fast', pages('y' * 100))
+    entry_size = max(entry.stat().st_size for entry in os.scandir(cache_folder))
+    # Makes 'old' and 'used' look an hour old, then reads 'used' so it becomes the most recently used
+    for entry in os.scandir(cache_folder):
+        os.utime(entry.path, (entry.stat().st_mtime - 3600, entry.stat().st_mtime - 3600))
+    assert load_cached_pages('used', 'fast') is not None
+
+    monkeypatch.setitem(app.config, 'PDF_CACHE_MAX_BYTES', 2 * entry_size)
+    store_cached_pages('new', 'fast', pages('z' * 100))
+
+    assert load_cached_pages('old', 'fast') is None
+    assert load_cached_pages('used', 'fast') is not None
+    assert load_cached_pages('new', 'fast') is not None
+
+
+def test_a_hit_never_runs_the_extraction_engine(cache_folder, monkeypatch):
+    source = io.BytesIO(b'%PDF syllabus')
+    extracted = []
+
+    def fake_extract(source, engine, metrics):
+        for page in pages('Homework 1 due Sept 15'):
+            extracted.append(page)
+            yield page
+    monkeypatch.setattr(app_module, 'extract_pdf_pages', fake_extract)
+
+    first, hit = get_pdf_pages(source, 'fast', {})
+    assert not hit
+    assert list(first) == pages('Homework 1 due Sept 15')
+
+    again, hit = get_pdf_pages(source, 'fast', {})
+    assert hit
+    assert list(again) == pages('Homework 1 due Sept 15')
+    assert len(extracted) == 1
+    assert load_cached_pages(hash_source(source), 'fast') is not None
+
+
+def test_unfinished_extraction_is_not_cached(cache_folder, monkeypatch):
+    monkeypatch.setattr(app_module, 'extract_pdf_pages', lambda source, engine, metrics: iter(pages('partial') * 2))
+    source = io.BytesIO(b'%PDF syllabus')
+
+    partial, _ = get_pdf_pages(source, 'fast', {})
+    next(partial)
+    partial.close()
+
+    assert load_cached_pages(hash_source(source), 'fast') is None